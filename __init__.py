@@ -16,23 +16,24 @@ System settings need to be made to this app on startup
 import sys
 sys.path.append('/home/pi/.local/lib/python3.7/site-packages')
 
+# imported first, the startup timeline begins with this import
+import startup
+# the timeline gets printed to the log once the radio plays and the app is up
+startup.expect('first audio', 'web UI ready')
+
+from werkzeug.serving import make_server
+
 from views import app, csrf
-from os import path, walk
 
-extra_dirs = ['./templates', './static']
-extra_files = extra_dirs[:]
-for extra_dir in extra_dirs:
-    for dirname, dirs, files in walk(extra_dir):
-        for filename in files:
-            filename = path.join(dirname, filename)
-            if path.isfile(filename):
-                extra_files.append(filename)
+startup.mark('views imported')
 
 app.config.update(TEMPLATES_AUTO_RELOAD=True)
 csrf.init_app(app)
 
 # ---------- PORT 80 App ---------------------
 # need sudo setcap 'cap_net_bind_service=+ep' /usr/bin/python3.7
-app.run(extra_files=extra_files, port=80, host='0.0.0.0')
-
-
+# threaded, every browser keeps a request open for /events
+server = make_server('0.0.0.0', 80, app, threaded=True)
+# the socket is bound, browsers can connect from now on
+startup.mark('web UI ready')
+server.serve_forever()
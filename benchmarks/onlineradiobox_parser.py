@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of the OnlineRadioBox now playing parser
+
+Compares the streaming parser of `onlineradiobox.py` with the former approach of
+building the whole page with `lxml.html` and evaluating the XPath on it.
+For every saved page it reports the mean parse time per poll and the peak memory
+one parse needs. libxml2 allocations are not visible to `tracemalloc`, so every parser
+runs once in a fresh process. Its peak resident set size is compared with the one of a
+fresh process that only imports the parsers and reads the page, without parsing it.
+
+Usage:
+    python3 benchmarks/onlineradiobox_parser.py [page.html ...] [-n 200]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import html
+from onlineradiobox import parse_now_playing, split_song
+
+DEFAULT_PAGES = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'static/tests/onlineradiobox_playlist.html')]
+CHUNK_SIZE = 8192
+# fresh processes per parser, the lowest peak is reported
+MEMORY_RUNS = 3
+
+
+def parse_full_tree(content):
+    """The parser used before: whole tree plus uncompiled XPath"""
+    webpage = html.fromstring(content)
+    text = webpage.xpath('//table[@class="tablelist-schedule"]//tbody//tr[1]//td[2]//text()')[0]
+    return split_song(text)
+
+
+def parse_streaming(content):
+    chunks = (content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+    return parse_now_playing(chunks)
+
+
+PARSERS = {
+    'full_tree': parse_full_tree,
+    'streaming': parse_streaming,
+}
+
+
+def max_rss(parser, page):
+    """Peak resident set size in KiB of a fresh process running `parser` once, `none` to not parse"""
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', parser, page])
+    return int(output)
+
+
+def peak_memory(parser, page):
+    """Peak memory in KiB a single parse adds to a process that read the page"""
+    baseline = min(max_rss('none', page) for _ in range(MEMORY_RUNS))
+    return min(max_rss(parser, page) for _ in range(MEMORY_RUNS)) - baseline
+
+
+def child(parser, page):
+    with open(page, 'rb') as f:
+        content = f.read()
+    result = None
+    if parser != 'none':
+        # the result is held until the peak is read
+        result = PARSERS[parser](content)
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    return result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('pages', nargs='*', default=DEFAULT_PAGES, help='saved OnlineRadioBox playlist pages')
+    argparser.add_argument('-n', '--number', type=int, default=200, help='parses per page and parser')
+    argparser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print('{:<40} {:<10} {:>12} {:>14}'.format('page', 'parser', 'ms / poll', 'peak KiB'))
+    for page in args.pages:
+        with open(page, 'rb') as f:
+            content = f.read()
+        for name, parser in PARSERS.items():
+            start = perf_counter()
+            for _ in range(args.number):
+                parser(content)
+            elapsed = (perf_counter() - start) / args.number
+            print('{:<40} {:<10} {:>12.3f} {:>14}'.format(
+                os.path.basename(page)[-40:], name, elapsed * 1000, peak_memory(name, page)))
+
+
+if __name__ == '__main__':
+    main()
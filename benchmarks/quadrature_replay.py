@@ -0,0 +1,171 @@
+"""
+Trace replay benchmark of the rotary switch decoding
+
+Replays edge sequences of the KY-040 through the `QuadratureDecoder` of
+`quadrature.py` and through the former decoding (falling clock edge, one sample of
+the data pin, 200 ms bouncetime). For every scenario it reports how many detents
+were decoded into the right direction and the mean cost per edge.
+
+Without arguments synthetic traces with known detents are generated: slow and fast
+turns, contact bounce, direction changes and lost edges. Recorded traces are CSV
+files with one `timestamp,clk,dt` edge per line, e.g. written from the
+`decoder.write_trace` of a running `KY040` object. For them only the net position is known,
+pass it with `--expected`.
+
+Usage:
+    python3 benchmarks/quadrature_replay.py [-n 2000] [--seed 1]
+    python3 benchmarks/quadrature_replay.py --trace edges.csv [--expected 12]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quadrature import QuadratureDecoder
+
+# states `CLK << 1 | DT` passed within one detent, ending in the rest state
+CYCLES = {
+    1: (2, 0, 1, 3),
+    -1: (1, 0, 2, 3),
+}
+ACCELERATION = ((0.025, 3), (0.05, 2))
+
+# name: detents per second, bounces per edge, chance to reverse, chance to lose an edge
+SCENARIOS = {
+    'slow': (5, 0, 0, 0),
+    'slow_bouncy': (5, 3, 0, 0),
+    'fast_bouncy': (40, 3, 0, 0),
+    'reversals': (10, 3, 0.2, 0),
+    'lost_edges': (10, 1, 0, 0.02),
+}
+
+
+class FallingEdgeDecoder:
+    """The former decoding: a falling clock edge plus one sample of the data pin"""
+
+    def __init__(self, bouncetime=0.2):
+        self.bouncetime = bouncetime
+        self.clk = 1
+        self.last = None
+
+    def edge(self, clk, dt, timestamp):
+        falling = self.clk == 1 and clk == 0
+        self.clk = clk
+        if not falling:
+            return 0
+        if self.last is not None and timestamp - self.last < self.bouncetime:
+            return 0
+        self.last = timestamp
+        return 1 if dt == 0 else -1
+
+
+def synthetic_trace(detents, rate, bounces, reverse, lose, rng):
+    """Generate the edges of `detents` detents
+
+    :return: List of `(direction, edges)` per detent with `edges` a list of `(timestamp, clk, dt)`
+    """
+    trace = []
+    timestamp = 0.0
+    direction = 1
+    state = 3
+    for _ in range(detents):
+        if rng.random() < reverse:
+            direction = -direction
+        period = 1 / rate * rng.uniform(0.8, 1.2)
+        edges = []
+        for new_state in CYCLES[direction]:
+            timestamp = timestamp + period / 4
+            bouncing = rng.randint(0, bounces)
+            for i in range(2 * bouncing + 1):
+                level = new_state if i % 2 == 0 else state
+                if rng.random() >= lose:
+                    edges.append((timestamp + i * 0.0001, level >> 1, level & 1))
+            state = new_state
+        trace.append((direction, edges))
+    return trace
+
+
+def replay(decoder, trace):
+    """Feed a synthetic trace to a decoder
+
+    :return: Tuple of detents decoded into the right direction and edges fed
+    """
+    correct = 0
+    edges = 0
+    for direction, detent in trace:
+        moved = 0
+        for timestamp, clk, dt in detent:
+            moved = moved + decoder.edge(clk, dt, timestamp)
+        edges = edges + len(detent)
+        if moved == direction:
+            correct = correct + 1
+    return correct, edges
+
+
+def replay_positions(decoder, trace):
+    for _, detent in trace:
+        for timestamp, clk, dt in detent:
+            yield decoder.edge(clk, dt, timestamp)
+
+
+def edge_cost(decoder, edges, number=20):
+    """Mean seconds per edge decoding `edges` `number` times"""
+    start = perf_counter()
+    for _ in range(number):
+        for timestamp, clk, dt in edges:
+            decoder.edge(clk, dt, timestamp)
+    return (perf_counter() - start) / (number * len(edges))
+
+
+DECODERS = {
+    'quadrature': lambda: QuadratureDecoder(),
+    'falling_edge': lambda: FallingEdgeDecoder(),
+}
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [(float(row[0]), int(row[1]), int(row[2])) for row in csv.reader(f)
+                if row and not row[0].startswith('#')]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('-n', '--number', type=int, default=2000, help='detents per synthetic scenario')
+    argparser.add_argument('--seed', type=int, default=1, help='seed of the synthetic traces')
+    argparser.add_argument('--trace', help='recorded trace, CSV with timestamp,clk,dt per edge')
+    argparser.add_argument('--expected', type=int, help='net detents of the recorded trace')
+    args = argparser.parse_args()
+
+    if args.trace:
+        edges = read_trace(args.trace)
+        print('{:<14} {:>8} {:>10} {:>10} {:>12}'.format('decoder', 'edges', 'net', 'expected', 'ns / edge'))
+        for name, factory in DECODERS.items():
+            decoder = factory()
+            net = sum(decoder.edge(clk, dt, timestamp) for timestamp, clk, dt in edges)
+            print('{:<14} {:>8} {:>10} {:>10} {:>12.0f}'.format(
+                name, len(edges), net, '-' if args.expected is None else args.expected,
+                edge_cost(factory(), edges) * 1e9))
+        return
+
+    rng = random.Random(args.seed)
+    print('{:<14} {:<14} {:>8} {:>10} {:>12}'.format('scenario', 'decoder', 'edges', 'correct %', 'ns / edge'))
+    for scenario, parameters in SCENARIOS.items():
+        trace = synthetic_trace(args.number, *parameters, rng=rng)
+        edges = [edge for _, detent in trace for edge in detent]
+        for name, factory in DECODERS.items():
+            correct, fed = replay(factory(), trace)
+            print('{:<14} {:<14} {:>8} {:>10.1f} {:>12.0f}'.format(
+                scenario, name, fed, correct / len(trace) * 100, edge_cost(factory(), edges) * 1e9))
+    accelerated = QuadratureDecoder(acceleration=ACCELERATION)
+    trace = synthetic_trace(args.number, *SCENARIOS['fast_bouncy'], rng=rng)
+    moved = sum(replay_positions(accelerated, trace))
+    print('\nfast_bouncy with acceleration {}: {} detents moved {} positions'.format(ACCELERATION, len(trace), moved))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+"""
+End-to-end benchmark of a channel switch, from the last edge of the dial to audio and UI
+
+Runs the whole radio (`KyoRadio`) on simulated hardware (see `hal.py`) against a local
+stand-in server for the streams and the OnlineRadioBox playlist pages. The dial is turned
+by scripted edges, every scenario is repeated and for every repetition it measures from
+the last edge until
+
+    audio: the player of the channel reached received its first stream bytes
+      (in a noise gap: until the LED blinks)
+    ui:    the state of `current.json`, which the web app shows, names the channel reached
+      (the state in memory, the file itself is written a moment later)
+
+Scenarios:
+
+    single_step:    turn detent by detent at a human pace to the next channel
+    fast_spin:      spin over many positions, where the dial ends up is measured
+    back_and_forth: jitter around a noise gap next to a channel, then step onto it
+
+For every scenario it reports p50/p95/p99 of both latencies, the number of streams
+opened, the maximum number of threads and the CPU time per repetition. The results
+are saved as JSON named after the git commit, pass an older file with `--compare`
+to see the change.
+
+Usage:
+    python3 benchmarks/switch_latency.py [-n 20] [--stream-delay 0.05] [--compare results/old.json]
+"""
+import argparse
+import datetime
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import hal
+
+hal.use('simulated')
+
+import requests
+from ky40 import KyoRadio, PlayerBackend, SCHEDULER, open_state_file
+
+PLAYLIST_PAGE = os.path.join(ROOT, 'static/tests/onlineradiobox_playlist.html')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks/results')
+CHANNELS = 8
+# seconds per detent
+HUMAN_PACE = 0.2
+SPIN_PACE = 0.01
+JITTER_PACE = 0.03
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """`/stream/<n>` sends an endless stream after `stream_delay` seconds, `/playlist/<n>` the saved page"""
+    stream_delay = 0.05
+
+    def do_GET(self):
+        if self.path.startswith('/playlist/'):
+            with open(PLAYLIST_PAGE, 'rb') as f:
+                content = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.end_headers()
+        sleep(self.stream_delay)
+        try:
+            while True:
+                self.wfile.write(b'\xff' * 4096)
+                self.wfile.flush()
+                sleep(0.25)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ProbeBackend(PlayerBackend):
+    """Player backend opening the stream like a player and reporting the audio start at its first bytes
+
+    Attributes:
+        loads: Number of streams opened
+    """
+
+    def __init__(self, errorlog="/tmp/log.txt"):
+        super().__init__(errorlog=errorlog)
+        self.loads = 0
+        self.response = None
+
+    def load(self, url, loop=False):
+        self.loads = self.loads + 1
+        threading.Thread(target=self._open, args=(url, self.current), daemon=True).start()
+
+    def _open(self, url, player):
+        try:
+            response = requests.get(url, stream=True, timeout=5)
+            next(response.iter_content(1024))
+        except (requests.RequestException, StopIteration):
+            return
+        with self._lock:
+            if self.current is not player:
+                response.close()
+                return
+            if self.response is not None:
+                self.response.close()
+            self.response = response
+            self.audio_started()
+
+    def unload(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def set_volume(self, volume):
+        pass
+
+    def state(self):
+        return {'url': self.current.mp3 if self.current is not None else None}
+
+    def noise_player(self, errorlog="/tmp/log.txt"):
+        # noise needs no stream
+        return NoPlayer()
+
+
+class NoPlayer:
+    """Noise player of the ProbeBackend, there is no noise to play"""
+
+    def __init__(self):
+        self._running = False
+
+    def start(self):
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def is_running(self):
+        return self._running
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile, `None` for no values"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(0, min(len(values) - 1, int(round(percent / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def read_current(current_json):
+    try:
+        return open_state_file(current_json).read().get('id')
+    except (OSError, ValueError):
+        return None
+
+
+class Bench:
+    """The radio on simulated hardware plus the stand-in server"""
+
+    def __init__(self, directory, stream_delay):
+        StandInHandler.stream_delay = stream_delay
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:' + str(self.server.server_address[1])
+
+        self.channels = [{'name': 'channel' + str(i), 'id': 'channel_id' + str(i),
+                          'stream': base + '/stream/' + str(i), 'onlineradiobox': base + '/playlist/' + str(i)}
+                         for i in range(1, CHANNELS + 1)]
+        channel_json = os.path.join(directory, 'channellist.json')
+        self.current_json = os.path.join(directory, 'current.json')
+        with open(channel_json, 'w') as f:
+            json.dump(self.channels, f)
+        with open(self.current_json, 'w') as f:
+            json.dump({'id': self.channels[0]['id'], 'radio': self.channels[0]['name'], 'song': ''}, f)
+
+        self.backend = ProbeBackend(errorlog=os.path.join(directory, 'errorlog.txt'))
+        self.radio = KyoRadio()
+        self.radio.player_backend = self.backend
+        self.radio.start(channeldict=channel_json, errorlog=os.path.join(directory, 'errorlog.txt'),
+                         lastfm_json=os.path.join(directory, 'lastfm.json'), current_channel_json=self.current_json)
+        self.gpio = hal.gpio()
+        while self.radio.ky040 is None or self.radio.ky040.t_dial is None:
+            sleep(0.01)
+        self.ky040 = self.radio.ky040
+        self.wait_steady(self.ky040.absolute, monotonic())
+
+    def turn(self, steps, pace):
+        """:return: Timestamp of the last edge"""
+        self.gpio.turn(self.ky040.clockPin, self.ky040.dataPin, steps, interval=pace)
+        return self.ky040.decoder.last_edge
+
+    def wait_steady(self, position, last_edge, timeout=10):
+        """Wait until the radio reached the state of a settled position
+
+        :return: Tuple of audio and ui latency in seconds, ui is `None` in a noise gap
+        """
+        ky040 = self.ky040
+        channel = ky040.channel_dicts[position]
+        audio = None
+        ui = None
+        deadline = last_edge + timeout
+        while monotonic() < deadline:
+            now = monotonic()
+            if channel is None:
+                if audio is None and not ky040.radio_on and ky040.led.is_running():
+                    audio = now - last_edge
+                if audio is not None:
+                    return audio, None
+            else:
+                radio = ky040.radio if ky040.radio_on and ky040.playing == position else None
+                if audio is None and radio is not None and radio.audio_started.is_set() \
+                        and radio.audio_started_at >= last_edge:
+                    audio = radio.audio_started_at - last_edge
+                if audio is None and radio is not None and radio.audio_started.is_set():
+                    # the channel was already playing, e.g. back at the same channel
+                    audio = now - last_edge
+                if ui is None and read_current(self.current_json) == channel['id']:
+                    ui = now - last_edge
+                if audio is not None and ui is not None:
+                    return audio, ui
+            sleep(0.001)
+        raise TimeoutError('position {} did not settle'.format(position))
+
+    def channel_ahead(self):
+        """Steps from the current position to the next channel clockwise"""
+        dial = self.ky040.dial
+        position = self.ky040.absolute
+        for steps in range(1, dial.size + 1):
+            if dial.channel(dial.step(position, steps)) is not None:
+                return steps
+        return 0
+
+    def single_step(self):
+        last_edge = None
+        for _ in range(self.channel_ahead()):
+            last_edge = self.turn(1, HUMAN_PACE)
+        return last_edge
+
+    def fast_spin(self):
+        return self.turn(self.ky040.dial.size // 2, SPIN_PACE)
+
+    def back_and_forth(self):
+        steps = self.channel_ahead()
+        if steps > 1:
+            self.turn(steps - 1, HUMAN_PACE)
+            self.wait_steady(self.ky040.absolute, monotonic())
+        for _ in range(10):
+            self.turn(-1, JITTER_PACE)
+            self.turn(1, JITTER_PACE)
+        # slow enough not to be accelerated
+        return self.turn(1, HUMAN_PACE)
+
+    def run(self, scenario, repetitions):
+        audio = []
+        ui = []
+        threads = threading.active_count()
+        loads = self.backend.loads
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_before = usage.ru_utime + usage.ru_stime
+        for _ in range(repetitions):
+            sampler_stop = threading.Event()
+            samples = []
+            sampler = threading.Thread(target=sample_threads, args=(sampler_stop, samples), daemon=True)
+            sampler.start()
+            last_edge = getattr(self, scenario)()
+            audio_latency, ui_latency = self.wait_steady(self.ky040.absolute, last_edge)
+            sampler_stop.set()
+            sampler.join()
+            threads = max([threads] + samples)
+            audio.append(audio_latency)
+            if ui_latency is not None:
+                ui.append(ui_latency)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            'repetitions': repetitions,
+            'audio': latencies(audio),
+            'ui': latencies(ui),
+            'streams_opened': self.backend.loads - loads,
+            'max_threads': threads,
+            'cpu_ms': (usage.ru_utime + usage.ru_stime - cpu_before) / repetitions * 1000,
+        }
+
+    def stop(self):
+        self.radio.stop()
+        SCHEDULER.stop()
+        self.server.shutdown()
+
+
+def sample_threads(stop, samples):
+    while not stop.wait(0.005):
+        samples.append(threading.active_count())
+
+
+def latencies(values):
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def ms(value):
+    return '-' if value is None else '{:.1f}'.format(value * 1000)
+
+
+def print_results(results, previous=None):
+    print('{:<16} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'scenario', 'audio50', 'audio95', 'audio99', 'ui50', 'ui95', 'ui99', 'streams', 'threads', 'cpu ms'))
+    for scenario, result in results['scenarios'].items():
+        print('{:<16} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8.1f}'.format(
+            scenario, ms(result['audio']['p50']), ms(result['audio']['p95']), ms(result['audio']['p99']),
+            ms(result['ui']['p50']), ms(result['ui']['p95']), ms(result['ui']['p99']),
+            result['streams_opened'], result['max_threads'], result['cpu_ms']))
+        if previous is not None and scenario in previous['scenarios']:
+            old = previous['scenarios'][scenario]
+            changes = []
+            for kind in ('audio', 'ui'):
+                if old[kind]['p95'] is not None and result[kind]['p95'] is not None:
+                    changes.append('{} p95 {:+.1f} ms'.format(kind, (result[kind]['p95'] - old[kind]['p95']) * 1000))
+            print('{:<16} vs {}: {}'.format('', previous['commit'], ', '.join(changes)))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('-n', '--number', type=int, default=20, help='repetitions per scenario')
+    argparser.add_argument('--stream-delay', type=float, default=0.05,
+                           help='seconds the stand-in server waits before the first stream bytes')
+    argparser.add_argument('--scenario', action='append', choices=['single_step', 'fast_spin', 'back_and_forth'],
+                           help='scenario to run, all if not given')
+    argparser.add_argument('--output', help='JSON file for the results, default results/switch_latency-<commit>.json')
+    argparser.add_argument('--compare', help='JSON results of an earlier run')
+    args = argparser.parse_args()
+
+    scenarios = args.scenario or ['single_step', 'fast_spin', 'back_and_forth']
+    with tempfile.TemporaryDirectory() as directory:
+        bench = Bench(directory, args.stream_delay)
+        try:
+            results = {
+                'commit': git_commit(),
+                'date': datetime.datetime.now().isoformat(),
+                'stream_delay': args.stream_delay,
+                'scenarios': {scenario: bench.run(scenario, args.number) for scenario in scenarios},
+            }
+        finally:
+            bench.stop()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, 'switch_latency-' + results['commit'] + '.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('\nsaved to ' + output)
+
+
+if __name__ == '__main__':
+    main()
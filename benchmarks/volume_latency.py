@@ -0,0 +1,66 @@
+"""
+Benchmark of the set-volume latency of the mixer backends
+
+Sets alternating volume levels on an ALSA control and reports the mean time per change of:
+
+    os.system: a shell, sudo and amixer per change, as done before
+    amixer:    the long-lived `amixer -s` pipe of `AmixerMixer`
+    alsa:      the open `pyalsaaudio` handle of `AlsaMixer` (only if installed)
+
+The pipe is closed and waited for at the end, so the time amixer needs to apply the
+changes is included.
+
+Usage:
+    python3 benchmarks/volume_latency.py [-n 50] [--control Digital] [--no-sudo]
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ky40 import AmixerMixer, AlsaMixer, alsaaudio
+
+LEVELS = (40, 45)
+
+
+def bench_os_system(control, number, sudo):
+    prefix = 'sudo ' if sudo else ''
+    start = perf_counter()
+    for i in range(number):
+        os.system(prefix + 'amixer sset "{control}" {volume}% > /dev/null'.format(
+            control=control, volume=LEVELS[i % 2]))
+    return perf_counter() - start
+
+
+def bench_mixer(mixer, number):
+    start = perf_counter()
+    for i in range(number):
+        mixer.write(LEVELS[i % 2])
+    mixer.close()
+    return perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument('-n', '--number', type=int, default=50, help='volume changes per backend')
+    argparser.add_argument('--control', default='Digital', help='ALSA mixer control')
+    argparser.add_argument('--no-sudo', action='store_true', help='run amixer without sudo')
+    args = argparser.parse_args()
+
+    command = ['amixer', '-s', '-q'] if args.no_sudo else ['sudo', 'amixer', '-s', '-q']
+    results = {
+        'os.system': bench_os_system(args.control, args.number, not args.no_sudo),
+        'amixer': bench_mixer(AmixerMixer(args.control, command=command), args.number),
+    }
+    if alsaaudio is not None:
+        results['alsa'] = bench_mixer(AlsaMixer(args.control), args.number)
+
+    print('{:<12} {:>14}'.format('backend', 'ms / change'))
+    for name, elapsed in results.items():
+        print('{:<12} {:>14.3f}'.format(name, elapsed / args.number * 1000))
+
+
+if __name__ == '__main__':
+    main()
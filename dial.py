@@ -0,0 +1,120 @@
+"""
+Layout of the channels on the dial of the rotary switch
+
+The dial is a circle of positions. Some positions play a channel, the positions
+in between are noise gaps. `DialMap` computes the layout once, so finding the
+channel of a position, the neighbours of a channel or the next position is a
+list lookup.
+"""
+from itertools import cycle
+
+# The former layout: channels at the positions 4, 8, 12, 20, 25, 30, 35 and 38 of 40
+DEFAULT_GAPS = (4, 3, 3, 7, 4, 4, 4, 2)
+DEFAULT_TAIL = 1
+
+
+class DialMap:
+    """Positions of the channels on the dial
+
+    Attributes:
+        size: Number of positions on the dial
+        positions: List of the position of every channel, ordered by channel index
+        slots: List with an entry per position, the index of the channel at the position
+          or `None` in a noise gap
+        nearest: List with an entry per position, the position of the nearest channel
+        distance: List with an entry per position, the number of steps to the nearest channel
+    """
+
+    def __init__(self, channel_count, gaps=DEFAULT_GAPS, tail=DEFAULT_TAIL):
+        """
+        :param channel_count: Number of channels on the dial
+        :param gaps: Number of noise positions before each channel. Either a number used for
+          all channels or a sequence, repeated if there are more channels than entries
+        :param tail: Number of noise positions after the last channel
+        """
+        if isinstance(gaps, int):
+            gaps = (gaps,)
+        self.positions = []
+        position = -1
+        for _, gap in zip(range(channel_count), cycle(gaps)):
+            position = position + gap + 1
+            self.positions.append(position)
+        self.size = position + tail + 1
+        self.slots = [None] * self.size
+        for index, position in enumerate(self.positions):
+            self.slots[position] = index
+        self._measure_distances()
+
+    def _measure_distances(self):
+        # Walk the circle twice in each direction, remembering the last channel passed
+        self.nearest = [None] * self.size
+        self.distance = [self.size] * self.size
+        if not self.positions:
+            return
+        for direction in (1, -1):
+            last = None
+            for step in range(2 * self.size):
+                position = (step * direction) % self.size
+                if self.slots[position] is not None:
+                    last = position
+                if last is None:
+                    continue
+                distance = (position - last) * direction % self.size
+                if distance < self.distance[position]:
+                    self.distance[position] = distance
+                    self.nearest[position] = last
+
+    @classmethod
+    def spread(cls, channel_count, resolution, min_gap=1):
+        """Spread the channels evenly over a dial
+
+        :param channel_count: Number of channels on the dial
+        :param resolution: Number of positions of the dial, increased if it does not fit
+          all channels with `min_gap` noise positions in between
+        :param min_gap: Minimum number of noise positions between two channels
+        :return: DialMap object
+        """
+        resolution = max(resolution, channel_count * (min_gap + 1))
+        gaps = []
+        used = 0
+        for index in range(1, channel_count + 1):
+            # end of the slice of the dial belonging to this channel
+            end = resolution * index // channel_count
+            gaps.append(end - used - 1)
+            used = end
+        # the first gap is split with the tail, so the first channel is not on position 0
+        tail = gaps[0] // 2
+        gaps[0] = gaps[0] - tail
+        return cls(channel_count, gaps, tail)
+
+    def __len__(self):
+        return self.size
+
+    def channel(self, position):
+        """Index of the channel at a position or `None` in a noise gap"""
+        return self.slots[position]
+
+    def step(self, position, steps):
+        """Position reached from `position` after `steps` steps, wrapping around the dial"""
+        return (position + steps) % self.size
+
+    def neighbours(self, position):
+        """Positions of the channels before and after the channel at `position`
+
+        :return: List of positions, without `position` itself and without duplicates
+        """
+        index = self.slots[position]
+        count = len(self.positions)
+        neighbours = []
+        for offset in (1, -1):
+            neighbour = self.positions[(index + offset) % count]
+            if neighbour != position and neighbour not in neighbours:
+                neighbours.append(neighbour)
+        return neighbours
+
+    def map(self, channels):
+        """List with an entry per position, the channel at the position or `None` in a noise gap
+
+        :param channels: List of channels ordered by channel index
+        """
+        return [None if index is None else channels[index] for index in self.slots]
@@ -0,0 +1,265 @@
+"""
+Hardware abstraction layer of the radio
+
+Everything in `ky40.py` talking to hardware goes through this module:
+
+    GPIO: The `RPi.GPIO` module or a `SimulatedGPIO` object
+    analog_in: Channel of the MCP3008 reading the volume potentiometer,
+      `adafruit_mcp3xxx` or a `SimulatedAnalogIn` object
+
+The backend is chosen by the environment variable `RADIOFLASK_HAL`:
+
+    real: the Raspberry Pi, fails if its modules are missing (default)
+    simulated: no hardware, inputs are set by scripts (see `SimulatedGPIO.turn`)
+    auto: real if `RPi.GPIO` can be loaded, else simulated. The reason of a fallback is
+      printed and kept in `fallback_error`, the radio writes it to its error log.
+
+or by calling `use` before the radio is started. With the simulated backend the radio
+plays with the `fake` player backend and the `FakeMixer`, so it runs on every Linux box.
+"""
+import os
+import threading
+from time import sleep
+
+# Gray-code states `CLK << 1 | DT` of one detent of the KY-040, see `quadrature.py`
+_DETENT = {
+    1: ((1, 0), (0, 0), (0, 1), (1, 1)),
+    -1: ((0, 1), (0, 0), (1, 0), (1, 1)),
+}
+
+_backend = None
+_gpio = None
+_analog = {}
+# why `auto` fell back to the simulated backend, `None` if it did not
+fallback_error = None
+
+
+class SimulatedPWM:
+    """PWM of a `SimulatedGPIO` pin
+
+    Attributes:
+        pin: GPIO number
+        frequency: Frequency in Hz
+        duty_cycle: Duty cycle in percent
+        running: Whether `start` was called
+    """
+
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.running = True
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+
+
+class SimulatedGPIO:
+    """Stand-in for the `RPi.GPIO` module
+
+    Inputs are changed by `set_input`, which calls the event callbacks of the pin like
+    `RPi.GPIO` does. Callbacks run in the thread calling `set_input`.
+
+    Attributes:
+        levels: Dictionary of pin -> level (0/1)
+        pwms: Dictionary of pin -> SimulatedPWM
+    """
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        self.levels = {}
+        self.pwms = {}
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        if initial is not None:
+            self.levels[pin] = int(bool(initial))
+        elif pin not in self.levels:
+            self.levels[pin] = 1 if pull_up_down == self.PUD_UP else 0
+
+    def input(self, pin):
+        return self.levels.get(pin, 0)
+
+    def output(self, pin, value):
+        self.levels[pin] = int(bool(value))
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        with self._lock:
+            self._events[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin):
+        with self._lock:
+            self._events.pop(pin, None)
+
+    def PWM(self, pin, frequency):
+        pwm = SimulatedPWM(pin, frequency)
+        self.pwms[pin] = pwm
+        return pwm
+
+    def cleanup(self, *pins):
+        with self._lock:
+            self._events = {}
+
+    def set_input(self, pin, level):
+        """Change the level of an input pin and call its event callback on a matching edge"""
+        level = int(bool(level))
+        old = self.levels.get(pin)
+        self.levels[pin] = level
+        if old == level:
+            return
+        with self._lock:
+            edge, callback = self._events.get(pin, (None, None))
+        if callback is None:
+            return
+        if edge == self.BOTH or (edge == self.FALLING and level == 0) or (edge == self.RISING and level == 1):
+            callback(pin)
+
+    def turn(self, clock_pin, data_pin, steps, interval=0.0):
+        """Turn the rotary switch by `steps` detents, negative steps turn anticlockwise
+
+        :param interval: Seconds one detent takes
+        """
+        direction = 1 if steps > 0 else -1
+        for _ in range(abs(steps)):
+            for clk, dt in _DETENT[direction]:
+                if clk != self.levels.get(clock_pin):
+                    self.set_input(clock_pin, clk)
+                if dt != self.levels.get(data_pin):
+                    self.set_input(data_pin, dt)
+                if interval:
+                    sleep(interval / 4)
+
+    def press(self, pin):
+        """Press and release a button pulled up"""
+        self.set_input(pin, 0)
+        self.set_input(pin, 1)
+
+
+class SimulatedAnalogIn:
+    """Stand-in for an `adafruit_mcp3xxx.analog_in.AnalogIn` channel
+
+    Attributes:
+        value: 16 bit value of the channel, set it to move the potentiometer
+        script: List of values returned by the next reads, one per read, before `value`
+    """
+
+    def __init__(self, value=0):
+        self._value = value
+        self.script = []
+
+    @property
+    def value(self):
+        if self.script:
+            self._value = self.script.pop(0)
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+
+    @property
+    def voltage(self):
+        return self.value * 3.3 / 65535
+
+
+def use(backend):
+    """Choose the backend, `real`, `simulated` or `auto`, before the radio is started"""
+    global _backend, _gpio, fallback_error
+    _backend = backend
+    _gpio = None
+    fallback_error = None
+    _analog.clear()
+
+
+def backend():
+    """:return: `real` or `simulated`"""
+    gpio()
+    return _backend
+
+
+def is_simulated():
+    return backend() == 'simulated'
+
+
+def gpio():
+    """:return: The `RPi.GPIO` module or the `SimulatedGPIO` object"""
+    global _backend, _gpio, fallback_error
+    if _gpio is not None:
+        return _gpio
+    if _backend is None:
+        _backend = os.environ.get('RADIOFLASK_HAL', 'real')
+    if _backend in ('real', 'auto'):
+        try:
+            import RPi.GPIO
+            _gpio = RPi.GPIO
+            _backend = 'real'
+            return _gpio
+        except (ImportError, RuntimeError) as e:
+            if _backend == 'real':
+                raise
+            fallback_error = "RPi.GPIO not available, running on SIMULATED hardware without audio: " + str(e)
+            print("WARNING: " + fallback_error)
+    _backend = 'simulated'
+    _gpio = SimulatedGPIO()
+    return _gpio
+
+
+def analog_in(channel=0, cs_pin='D22'):
+    """Channel of the MCP3008
+
+    :param channel: Channel of the MCP3008, `P0` to `P7`
+    :param cs_pin: Name of the `board` pin used as chip select
+    :return: `AnalogIn` or `SimulatedAnalogIn` object, the same for every call on simulated hardware
+    """
+    if is_simulated():
+        return _analog.setdefault(channel, SimulatedAnalogIn())
+    import board
+    import busio
+    import digitalio
+    import adafruit_mcp3xxx.mcp3008 as MCP
+    from adafruit_mcp3xxx.analog_in import AnalogIn
+
+    spi = busio.SPI(clock=board.SCK, MISO=board.MISO, MOSI=board.MOSI)
+    # create the cs (chip select)
+    cs = digitalio.DigitalInOut(getattr(board, cs_pin))
+    # create the mcp object
+    mcp = MCP.MCP3008(spi, cs)
+    return AnalogIn(mcp, getattr(MCP, 'P' + str(channel)))
+
+
+class _GPIOProxy:
+    """Module-like object forwarding to the GPIO of the chosen backend"""
+
+    def __getattr__(self, name):
+        return getattr(gpio(), name)
+
+
+GPIO = _GPIOProxy()
@@ -14,26 +14,577 @@ stuffaboutcode.com
 Additional code added by Conrad Storz 2015 and 2016
 """
 import threading
-import RPi.GPIO as GPIO
-from time import sleep
+import socket
+import heapq
+import itertools
+import math
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+import hal
+from hal import GPIO
+from time import sleep, monotonic, perf_counter, time
 import random
-from subprocess import Popen, call, check_output
+from subprocess import Popen, call, check_output, PIPE, DEVNULL
 import re
 import os
 import signal
-import busio
-import digitalio
-import board
-import adafruit_mcp3xxx.mcp3008 as MCP
-from adafruit_mcp3xxx.analog_in import AnalogIn
 import json
-import requests
+import sqlite3
+from functools import partial
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
 import datetime
-from lxml import html
-import pylast
-from pylast import NetworkError, WSError, MalformedResponseError
+from quadrature import QuadratureDecoder
+from dial import DialMap
 import calendar
-from pytz import timezone
+import getpass
+import shutil
+import startup
+from logbook import open_log, flush_logs
+from startup import lazy_import
+# imported at the first use, so the radio plays before these are loaded
+requests = lazy_import('requests')
+pylast = lazy_import('pylast')
+onlineradiobox = lazy_import('onlineradiobox')
+np = lazy_import('numpy')
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+# stdbuf makes the output of omxplayer line buffered
+STDBUF = shutil.which('stdbuf')
+
+
+class Timer:
+    """Handle of a job registered at a `Scheduler`
+
+    Attributes:
+        scheduler: The `Scheduler` running this job
+        when: `time.monotonic()` value when the job runs next
+        interval: Seconds between two runs, `None` for a one-shot job
+        function: Callable to run
+        args: Positional arguments handed to `function`
+        blocking: True if the job does I/O and must run in a worker thread
+          instead of the scheduler thread
+        cancelled: True once `cancel` was called
+    """
+
+    def __init__(self, scheduler, when, interval, function, args=(), blocking=False):
+        self.scheduler = scheduler
+        self.when = when
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.blocking = blocking
+        self.cancelled = False
+
+    def cancel(self):
+        """Make sure this job never runs again
+
+        A run that is already executing finishes, but it will not be rescheduled.
+        """
+        self.cancelled = True
+
+
+class Scheduler:
+    """One shared timer thread for all periodic jobs of the radio
+
+    Jobs are kept in a heap sorted by their next due time. The scheduler thread sleeps
+    until the first job is due, so nothing wakes up in between. Jobs marked as `blocking`
+    (network, subprocesses) are handed to a small thread pool so they cannot delay
+    the other timers. Periodic jobs are rescheduled `interval` seconds after a run
+    finished, which keeps a slow job from piling up.
+
+    Attributes:
+        workers: Number of worker threads for blocking jobs
+        stop_event: `threading.Event` that is set as soon as the scheduler should stop
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        """Start the scheduler thread if it is not running yet"""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Drop all jobs and stop the scheduler thread immediately"""
+        self.stop_event.set()
+        with self._condition:
+            for _, _, timer in self._heap:
+                timer.cancel()
+            self._heap = []
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def call_later(self, delay, function, *args, blocking=False):
+        """Run `function(*args)` once after `delay` seconds
+
+        :return: `Timer` that can be cancelled
+        """
+        return self._schedule(Timer(self, monotonic() + delay, None, function, args, blocking))
+
+    def call_every(self, interval, function, *args, first=None, blocking=False):
+        """Run `function(*args)` every `interval` seconds
+
+        :param first: Seconds until the first run, defaults to `interval`
+        :return: `Timer` that can be cancelled
+        """
+        if first is None:
+            first = interval
+        return self._schedule(Timer(self, monotonic() + first, interval, function, args, blocking))
+
+    def _schedule(self, timer):
+        self.start()
+        self._push(timer)
+        return timer
+
+    def _push(self, timer):
+        with self._condition:
+            heapq.heappush(self._heap, (timer.when, next(self._counter), timer))
+            self._condition.notify()
+
+    def _next_due(self):
+        """Wait until a job is due or the scheduler is stopped
+
+        :return: The due `Timer` or `None` if the scheduler was stopped
+        """
+        with self._condition:
+            while not self.stop_event.is_set():
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                when, _, timer = self._heap[0]
+                if timer.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+                delay = when - monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                return timer
+        return None
+
+    def _run(self):
+        while True:
+            timer = self._next_due()
+            if timer is None:
+                return
+            if timer.blocking:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix="scheduler-job")
+                self._executor.submit(self._execute, timer)
+            else:
+                self._execute(timer)
+
+    def _execute(self, timer):
+        if timer.cancelled or self.stop_event.is_set():
+            return
+        try:
+            timer.function(*timer.args)
+        except Exception as e:
+            print("Scheduled job failed: " + str(e))
+        if timer.interval is not None and not timer.cancelled and not self.stop_event.is_set():
+            timer.when = monotonic() + timer.interval
+            self._push(timer)
+
+
+# Scheduler shared by all periodic jobs of the radio
+SCHEDULER = Scheduler()
+
+
+class RadioEvents:
+    """Latest state of the radio, clients waiting for a change are woken at once
+
+    Every topic keeps only its latest data and the version it changed at, so a client
+    that missed several changes gets the current state of each topic in one go. Waiting
+    clients block on one condition, nothing is polled. Topics:
+
+        current: Dictionary of the channel playing, `id`, `radio` and `song`
+        channel: Dictionary of the settled dial `position` and the channel `id`, `None` in a noise gap
+        volume: Volume in percent
+        stations: List of dictionaries of all channels with their song, see `NowPlayingPrefetcher.snapshot`
+
+    Attributes:
+        version: Number increased on every change
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._topics = {}
+        self._condition = threading.Condition()
+
+    def publish(self, topic, data):
+        """Set the data of a topic and wake the waiting clients if it changed"""
+        with self._condition:
+            if topic in self._topics and self._topics[topic][1] == data:
+                return
+            self.version = self.version + 1
+            self._topics[topic] = (self.version, data)
+            self._condition.notify_all()
+
+    def changes(self, version=0):
+        """:return: Tuple of a dictionary of topic -> data changed after `version` and the current version"""
+        with self._condition:
+            return {topic: data for topic, (changed, data) in self._topics.items() if changed > version}, \
+                self.version
+
+    def get(self, *topics):
+        """:return: Tuple of a dictionary of topic -> data of `topics` and the version the last of them changed at"""
+        with self._condition:
+            known = [topic for topic in topics if topic in self._topics]
+            return {topic: self._topics[topic][1] for topic in known}, \
+                max([self._topics[topic][0] for topic in known] + [0])
+
+    def wait(self, version, timeout=None):
+        """Wait until anything changed after `version`
+
+        :return: See `changes`, the dictionary is empty if nothing changed within `timeout` seconds
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version > version, timeout)
+            return self.changes(version)
+
+
+# State of the radio pushed to the web UI
+EVENTS = RadioEvents()
+
+
+class HttpClient:
+    """Shared HTTP client for all scrapers of the radio
+
+    All requests go through one `requests.Session`, so connections to the same host
+    are kept alive and reused instead of opening a new TCP/TLS connection per poll.
+    Every request has a connect and a read timeout, failed requests are retried a few
+    times with an exponential backoff. The client remembers `ETag` and `Last-Modified`
+    of every URL and sends them back as `If-None-Match` / `If-Modified-Since`, so an
+    unchanged page is answered with a bodyless `304 Not Modified`.
+
+    Attributes:
+        session: `requests.Session` keeping the connection pool, created with the first request
+        timeout: `(connect, read)` timeout in seconds
+        _validators: Dictionary of url -> (etag, last_modified) of the last answer
+    """
+
+    def __init__(self, timeout=(3.05, 10), retries=3, backoff_factor=0.5, pool_size=4):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self._session = None
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                retry = requests.adapters.Retry(total=self.retries, backoff_factor=self.backoff_factor,
+                                                status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+                adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                                        max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def get(self, url, conditional=True, stream=False):
+        """Conditional GET of an URL
+
+        :param url: URL to request
+        :param conditional: Whether to send the validators of the last answer
+        :param stream: Whether to stream the body, see `requests.Session.get`
+        :return: `requests.Response` or `None` if the page did not change since the last request
+        :raises requests.RequestException: if the request failed after all retries
+        """
+        headers = {}
+        if conditional:
+            with self._lock:
+                etag, last_modified = self._validators.get(url, (None, None))
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+        if response.status_code == 304:
+            response.close()
+            return None
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+
+        with self._lock:
+            self._validators[url] = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response
+
+
+# HTTP client shared by all scrapers
+HTTP_CLIENT = HttpClient()
+
+
+class LastFMSession:
+    """Shared last.fm connection with a cached session key
+
+    Authenticating with user and password needs an `auth.getMobileSession` request. This is
+    done once, the session key is stored in `session_file` and reused for every connection
+    afterwards, also after a reboot. Only if last.fm rejects the key, `invalidate` drops it,
+    so the next `get_network` authenticates again.
+
+    Attributes:
+        doc: Dictionary containing `api`, `api_secret`, `user`, `password` to connect with last.fm API
+        session_file: `json` file on disk to store the session key
+        network: `pylast.LastFMNetwork` connection, `None` until `get_network` was called
+    """
+
+    def __init__(self, doc, session_file):
+        self.doc = doc
+        self.session_file = session_file
+        self.network = None
+        self._lock = threading.Lock()
+
+    def get_network(self):
+        """Connection to last.fm, authenticates only if no valid session key is stored
+
+        :return: `pylast.LastFMNetwork`
+        :raises WSError, NetworkError: if the authentication failed
+        """
+        with self._lock:
+            if self.network is None:
+                session_key = self._read_session_key()
+                if session_key is not None:
+                    self.network = pylast.LastFMNetwork(api_key=self.doc['api'], api_secret=self.doc['api_secret'],
+                                                        username=self.doc['user'], session_key=session_key)
+                else:
+                    self.network = pylast.LastFMNetwork(api_key=self.doc['api'], api_secret=self.doc['api_secret'],
+                                                        username=self.doc['user'],
+                                                        password_hash=self.doc['password'])
+                    self._write_session_key(self.network.session_key)
+            return self.network
+
+    def invalidate(self):
+        """Forget the session key after last.fm rejected it"""
+        with self._lock:
+            self.network = None
+            self._write_session_key(None)
+
+    def _read_session_key(self):
+        try:
+            with open(self.session_file) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get('user') != self.doc['user'] or stored.get('api') != self.doc['api']:
+            return None
+        return stored.get('session_key')
+
+    def _write_session_key(self, session_key):
+        with open(self.session_file, 'w') as f:
+            json.dump({
+                'user': self.doc['user'],
+                'api': self.doc['api'],
+                'session_key': session_key
+            }, f)
+
+
+class ScrobbleQueue:
+    """Durable queue of songs waiting to be scrobbled to last.fm
+
+    Songs are put into the queue without any network or disk access on the caller side.
+    A flush job on the `SCHEDULER` writes them into a SQLite database and sends them in
+    batches of up to `BATCH_SIZE` (the limit of `scrobble_many`). Songs are only deleted from
+    the database once last.fm accepted them, so they survive network outages and reboots.
+    The songs left from before a reboot are sent by a flush job registered on creation.
+    After a failed scrobble, the next try waits twice as long, up to `max_delay` seconds.
+    If last.fm rejects a batch for its content, its songs are sent one by one and the rejected
+    ones are moved to the `rejected` table, so they do not block the queue. Songs older than
+    `MAX_AGE` are dropped before sending, last.fm does not accept them anymore. Without a
+    `session` or `network` (last.fm not set up) songs are not queued at all.
+
+    Attributes:
+        db_file: Location of the SQLite database
+        session: `LastFMSession` providing the connection, authentication is done by the flush job
+        network: `pylast.LastFMNetwork` connection used for scrobbling if no `session` is given
+        errorlog: .txt file to write any occuring errors to
+        retry_delay: Seconds to wait after the first failed scrobble
+        max_delay: Maximum seconds to wait between two failed scrobbles
+        _delay: Seconds to wait after the next failed scrobble
+        _next_try: `time.monotonic()` value before which nothing is sent to last.fm
+        _pending: Songs not yet written to the database
+        _scheduled: Whether a flush job for the `_pending` songs is registered
+        _retry_timer: `Timer` of the flush job after a failed scrobble
+    """
+    BATCH_SIZE = 50
+    # last.fm rejects scrobbles older than 14 days
+    MAX_AGE = 14 * 24 * 3600
+    # last.fm error codes worth a retry: authentication, session key, API key, signature,
+    # service offline or temporarily unavailable, operation failed and rate limit exceeded.
+    # Any other `WSError` rejects the songs themselves.
+    RETRY_STATUS = ('4', '8', '9', '10', '11', '13', '16', '17', '26', '29')
+
+    def __init__(self, db_file, session=None, network=None, errorlog="/tmp/log.txt", retry_delay=30,
+                 max_delay=1800):
+        self.db_file = db_file
+        self.session = session
+        self.network = network
+        self.errorlog = errorlog
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self._delay = retry_delay
+        self._next_try = 0
+        self._pending = []
+        self._scheduled = True
+        self._retry_timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        db = self._connect()
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS scrobbles ("
+                       "id INTEGER PRIMARY KEY AUTOINCREMENT, artist TEXT, title TEXT, timestamp INTEGER)")
+            db.execute("CREATE TABLE IF NOT EXISTS rejected ("
+                       "id INTEGER PRIMARY KEY, artist TEXT, title TEXT, timestamp INTEGER, error TEXT)")
+        db.close()
+        # send the songs left from before a reboot
+        SCHEDULER.call_later(0, self.flush, blocking=True)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=10)
+
+    def put(self, tracklist, network=None):
+        """Queue songs for scrobbling
+
+        :param tracklist: List of dictionaries containing `artist`, `title`, `timestamp` (seconds)
+        :param network: `pylast.LastFMNetwork` connection to use from now on
+        """
+        with self._lock:
+            if network is not None:
+                self.network = network
+            if self.session is None and self.network is None:
+                # last.fm is not set up, nothing to scrobble to
+                return
+            self._pending.extend(tracklist)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        SCHEDULER.call_later(0, self.flush, blocking=True)
+
+    def __len__(self):
+        db = self._connect()
+        count = db.execute("SELECT COUNT(*) FROM scrobbles").fetchone()[0]
+        db.close()
+        return count + len(self._pending)
+
+    def flush(self):
+        """Store all pending songs and scrobble the database content in batches"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = []
+                self._scheduled = False
+                session = self.session
+                network = self.network
+
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany("INSERT INTO scrobbles (artist, title, timestamp) VALUES (?, ?, ?)",
+                                   [(track["artist"], track["title"], int(track["timestamp"]))
+                                    for track in pending])
+                with db:
+                    expired = db.execute("DELETE FROM scrobbles WHERE timestamp < ?",
+                                         (int(time()) - self.MAX_AGE,)).rowcount
+                if expired > 0:
+                    open_log(self.errorlog).write("Dropped " + str(expired) + " songs older than 14 days",
+                                                  source='ScrobbleQueue', level='WARNING')
+                if monotonic() < self._next_try:
+                    return
+                if session is not None:
+                    network = session.get_network()
+                if network is None:
+                    # no connection yet, try again later if anything waits
+                    if db.execute("SELECT COUNT(*) FROM scrobbles").fetchone()[0] > 0:
+                        self._retry_later()
+                    return
+                while True:
+                    rows = db.execute("SELECT id, artist, title, timestamp FROM scrobbles ORDER BY id LIMIT ?",
+                                      (self.BATCH_SIZE,)).fetchall()
+                    if not rows:
+                        break
+                    try:
+                        self._scrobble(network, rows)
+                    except pylast.WSError as e:
+                        if self._is_retry_error(e):
+                            raise
+                        # one of the songs was rejected, find it by sending them one by one
+                        for row in rows:
+                            try:
+                                self._scrobble(network, [row])
+                            except pylast.WSError as row_error:
+                                if self._is_retry_error(row_error):
+                                    raise
+                                self._reject(db, row, row_error)
+                            else:
+                                with db:
+                                    db.execute("DELETE FROM scrobbles WHERE id = ?", (row[0],))
+                        continue
+                    with db:
+                        db.execute("DELETE FROM scrobbles WHERE id <= ?", (rows[-1][0],))
+                self._delay = self.retry_delay
+            except (pylast.WSError, pylast.NetworkError, pylast.MalformedResponseError, sqlite3.Error) as e:
+                if isinstance(e, pylast.WSError) and session is not None and \
+                        str(e.get_id()) == str(pylast.STATUS_INVALID_SK):
+                    session.invalidate()
+                open_log(self.errorlog).write("LastFM Scrobble Error: " + str(e) + " - retry in " +
+                                              str(self._delay) + " s", source='ScrobbleQueue')
+                self._retry_later()
+            finally:
+                db.close()
+
+    @staticmethod
+    def _scrobble(network, rows):
+        network.scrobble_many(tracks=[{"artist": artist, "title": title, "timestamp": timestamp}
+                                      for _, artist, title, timestamp in rows])
+
+    def _is_retry_error(self, error):
+        return str(error.get_id()) in self.RETRY_STATUS
+
+    def _reject(self, db, row, error):
+        """Move a song last.fm rejected from the queue to the `rejected` table"""
+        with db:
+            db.execute("INSERT OR REPLACE INTO rejected (id, artist, title, timestamp, error) VALUES (?, ?, ?, ?, ?)",
+                       tuple(row) + (str(error),))
+            db.execute("DELETE FROM scrobbles WHERE id = ?", (row[0],))
+        open_log(self.errorlog).write("LastFM rejected " + row[1] + " - " + row[2] + " - " + str(row[3]) + ": " +
+                                      str(error), source='ScrobbleQueue')
+
+    def _retry_later(self):
+        """Register the next flush after `_delay` seconds and double the delay"""
+        self._next_try = monotonic() + self._delay
+        if self._retry_timer is not None:
+            self._retry_timer.cancel()
+        self._retry_timer = SCHEDULER.call_later(self._delay, self.flush, blocking=True)
+        self._delay = min(self._delay * 2, self.max_delay)
 
 
 class LastFMRadioScrobble():
@@ -41,23 +592,30 @@ class LastFMRadioScrobble():
     the last.fm API
     On init it connects to the last.fm API with a session key
     Without a session key it will cause a WSError
+    With a `queue` no connection is made, the queue connects in the background
 
     Attributes:
         network: `pylast.LastFMNetwork` connection
         error: `string` to describe the errors
+        queue: `ScrobbleQueue` the songs are handed to, if `None` they are scrobbled directly
 
     :param network:  `pylast.LastFMNetwork` connection
     :param doc: Dictionary containing `api`, `api_secret`, `user`, `password` to connect with last.fm API
+    :param queue: `ScrobbleQueue` to scrobble in the background
     """
 
-    def __init__(self, network=None, doc=None):
+    def __init__(self, network=None, doc=None, queue=None):
 
-        if network is None:
+        self.queue = queue
+        self.error = None
+        if network is None and queue is not None:
+            self.network = None
+        elif network is None:
             try:
                 self.network = pylast.LastFMNetwork(api_key=doc['api'], api_secret=doc['api_secret'],
                                                     username=doc['user'], password_hash=doc['password'])
                 self.error = None
-            except WSError as e:
+            except (pylast.WSError, pylast.NetworkError, pylast.MalformedResponseError) as e:
                 self.network = None
                 self.error = "LastFM Connection: " + str(e) + "\n"
         else:
@@ -73,6 +631,8 @@ class LastFMRadioScrobble():
 
         :param indeces: A list of integers telling which elements to take from the songlist and scrobble them
 
+        If a `self.queue` is given, the songs are just queued, even without a network connection.
+
         :return: The list of songs as "Artist - Title - Timestamp" to be displayed in the app
         """
         if in_dict is None:
@@ -83,7 +643,7 @@ class LastFMRadioScrobble():
         if indeces is None:
             indeces = list()
 
-        if self.network is not None:
+        if self.network is not None or self.queue is not None:
             data_list = in_dict
 
             try:
@@ -99,10 +659,13 @@ class LastFMRadioScrobble():
             else:
                 tracklist = [{"title": data_list[index]["title"],
                               "artist": data_list[index]["artist"],
-                              "timestamp": datetime.datetime.now()}
+                              "timestamp": calendar.timegm(datetime.datetime.now().timetuple())}
                              for index in indeces]
             try:
-                self.network.scrobble_many(tracks=tracklist)
+                if self.queue is not None:
+                    self.queue.put(tracklist, self.network)
+                else:
+                    self.network.scrobble_many(tracks=tracklist)
 
                 if has_timestamp:
                     scrobbling_list = [" - ".join([
@@ -116,7 +679,7 @@ class LastFMRadioScrobble():
                     scrobbling_list = [" - ".join([
                         data_list[index]["artist"],
                         data_list[index]["title"]]) for index in indeces]
-            except (WSError, NetworkError, KeyError, MalformedResponseError, TypeError) as d:
+            except (pylast.WSError, pylast.NetworkError, KeyError, pylast.MalformedResponseError, TypeError) as d:
                 self.error = "LastFM Scrobble Error:" + str(d)
                 scrobbling_list = False
 
@@ -126,6 +689,128 @@ class LastFMRadioScrobble():
         return self.error is not None
 
 
+class StateFile:
+    """JSON file on the SD card, written behind the changes of its state
+
+    `update` marks the state dirty only if it really changed. A dirty state is written
+    `delay` seconds later by the `SCHEDULER`, so changes following each other quickly (a
+    channel switch and the song of the new channel) are written once. The state is written
+    to a temporary file which is synced and renamed over the file, so a reader sees either
+    the old or the new state, never a half written file. A failed write is tried again
+    `delay` seconds later.
+
+    Attributes:
+        path: Location of the json file
+        delay: Seconds a change waits for further changes before it is written
+        errorlog: .txt file to write failed writes to
+        error: Error of the last write or `None` if it succeeded
+        state: Dictionary of the last state, `None` until read or updated
+        dirty: True if `state` was not written yet
+        writes: Number of times the file was written
+    """
+
+    def __init__(self, path, delay=0.25, errorlog="/tmp/log.txt"):
+        self.path = path
+        self.delay = delay
+        self.errorlog = errorlog
+        self.error = None
+        self.state = None
+        self.dirty = False
+        self.writes = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def read(self):
+        """:return: Copy of the state, read from disk if it was never read or updated"""
+        with self._lock:
+            if self.state is None:
+                with open(self.path) as f:
+                    self.state = json.load(f)
+            return dict(self.state)
+
+    def update(self, state):
+        """Replace the state, it gets written unless it is equal to the current one
+
+        :param state: Dictionary of the new state
+        :return: True if the state changed
+        """
+        with self._lock:
+            if state == self.state:
+                return False
+            self.state = dict(state)
+            self.dirty = True
+            if self._timer is None:
+                self._timer = SCHEDULER.call_later(self.delay, self.flush, blocking=True)
+        return True
+
+    def flush(self):
+        """Write the state now if it is dirty"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.dirty:
+                    return
+                state = dict(self.state)
+                self.dirty = False
+            try:
+                self._write(state)
+            except OSError as e:
+                # a lasting error is logged once, not on every retry
+                if str(e) != self.error:
+                    open_log(self.errorlog).write("Writing " + self.path + " failed: " + str(e), source='StateFile')
+                self.error = str(e)
+                with self._lock:
+                    self.dirty = True
+                    if self._timer is None:
+                        self._timer = SCHEDULER.call_later(self.delay, self.flush, blocking=True)
+                return
+            self.error = None
+
+    def _write(self, state):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        # sync the directory, so the rename survives a power cut
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.writes = self.writes + 1
+
+
+_state_files = {}
+_state_files_lock = threading.Lock()
+
+
+def open_state_file(path, errorlog=None):
+    """:return: The StateFile of `path`, the same object for every call
+
+    :param errorlog: .txt file the StateFile writes failed writes to from now on, `None` keeps it
+    """
+    path = os.path.abspath(path)
+    with _state_files_lock:
+        if path not in _state_files:
+            _state_files[path] = StateFile(path)
+        if errorlog is not None:
+            _state_files[path].errorlog = errorlog
+        return _state_files[path]
+
+
+def flush_state_files():
+    """Write all dirty StateFiles now, e.g. before stopping"""
+    with _state_files_lock:
+        state_files = list(_state_files.values())
+    for state_file in state_files:
+        state_file.flush()
+
+
 class CurrentChannel:
     """Class for currently playing channel
 
@@ -146,15 +831,16 @@ class CurrentChannel:
     def write_json(self):
         """ Dump the information to drive
 
-        Returns: nth
+        Returns: nth, the file is written behind by its StateFile and only if anything changed
 
         """
-        with open(self.json_file, 'w') as f:
-            json.dump({
-                'id': self.id,
-                'radio': self.radio,
-                'song': self.song
-            }, f)
+        state = {
+            'id': self.id,
+            'radio': self.radio,
+            'song': self.song
+        }
+        open_state_file(self.json_file).update(state)
+        EVENTS.publish('current', state)
 
     def set_song(self, song):
         """ Setter for `song` attribute
@@ -177,14 +863,18 @@ class SongGetter:
           will only be used in case no song was detected.
         tracklist: Array of tracks derived from OnlineRadioBox
         error: Any kind of error should be stored as a `string`
+        client: `HttpClient` used to download the OnlineRadioBox page
 
     """
 
-    def __init__(self, url="", stationname="none"):
+    def __init__(self, url="", stationname="none", client=None):
         self.url = url
         self.stationname = stationname
         self.tracklist = []
         self.error = None
+        if client is None:
+            client = HTTP_CLIENT
+        self.client = client
 
     def get_tracklist(self):
         """ Derive tracklist from URL
@@ -197,67 +887,382 @@ class SongGetter:
         `title`, `artist`, `timestamp` where the timestamp is given as
         `((datetime.datetime.now()) - datetime.datetime(1970, 1, 1)).total_seconds()`
 
+        If the page did not change since the last call, or it does not show a song, `self.tracklist`
+        is kept as it is. The page is streamed into `parse_now_playing`, which stops parsing at the
+        first song. The rest of the page is not downloaded.
+
         Returns:
 
         """
         self.error = None
         now = (datetime.datetime.now()) - datetime.datetime(1970, 1, 1)
+        no_song = [{"title": "try",
+                    "artist": "catch",
+                    "timestamp": now.total_seconds()}]
 
         try:
-            page = requests.get(self.url)
-            webpage = html.fromstring(page.content)
-
-            string = webpage.xpath('//table[@class="tablelist-schedule"]//tbody//tr[1]//td[2]//text()')[0].split(
-                ' - ', 1)
-            if len(string) == 1:
-                string = webpage.xpath('//table[@class="tablelist-schedule"]//tbody//tr[1]//td[2]//text()')[
-                    0].split(' von ', 1)
-                if len(string) == 1:
-                    artist = self.stationname
-                    track = string
-                    if isinstance(track, list):
-                        track = track[0]
-                else:
-                    artist = string[1][0]
-                    track = string[0][0]
-            else:
-                artist = string[0]
-                track = string[1]
+            has_song = len(self.tracklist) > 0 and self.tracklist[0]["title"] != "try"
+            response = self.client.get(self.url, conditional=has_song, stream=True)
+            if response is None:
+                return
+            # closing the response drops the connection instead of reading the rest of the page
+            with response:
+                now_playing = onlineradiobox.parse_now_playing(response.iter_content(chunk_size=8192),
+                                                               stationname=self.stationname,
+                                                               timestamp=now.total_seconds())
+        except (requests.RequestException, onlineradiobox.etree.LxmlError) as e:
+            self.error = "OnlineRadioBox Link does not work: " + self.url + " " + str(e)
+            self.tracklist = no_song
+            return
+
+        if now_playing is not None:
+            self.tracklist = [now_playing._asdict()]
+        elif not has_song:
+            self.tracklist = no_song
+
+
+class IcyMetadataReader:
+    """Class to receive songs from the ICY metadata of a stream
+
+    Shoutcast / Icecast streams send the currently playing song inside the stream if the
+    request contains `Icy-MetaData: 1`. Every `icy-metaint` bytes of audio, one length byte
+    and a metadata block like `StreamTitle='Artist - Title';` follow.
+
+    Upon start, this class opens the stream and blocks while reading it. The audio is skipped,
+    whenever the `StreamTitle` changes, `callback` is called with a `NowPlaying` record.
+    Note that this keeps a second connection to the stream open, but no page is polled.
+    If the connection breaks, it is opened again after `retry_delay` seconds. If the server does
+    not send `icy-metaint`, the stream has no metadata: the reader stops and calls `fallback`.
 
-            self.tracklist = [{"title": track,
-                               "artist": artist,
-                               "timestamp": now.total_seconds()}]
-        except:
-            self.error = "OnlineRadioBox Link does not work: " + self.url
-            self.tracklist = [{"title": "try",
-                               "artist": "catch",
-                               "timestamp": now.total_seconds()}]
+    Attributes:
+        url: Stream URL of the channel
+        stationname: Any `String` describing the name of the radio station. This
+          will be used as artist if the title does not contain one
+        callback: Function called with a `NowPlaying` record on every title change
+        error: Any kind of error should be stored as a `string`
+        title: Last `StreamTitle` received
+        client: `HttpClient` used to open the stream
+        retry_delay: Seconds to wait before reconnecting after an error
+        fallback: Function called without arguments if the stream has no metadata
+        _running: Whether the stream is read
+        _response: `requests.Response` of the open stream
+    """
+    STREAM_TITLE = re.compile(rb"StreamTitle='(.*?)';", re.S)
+
+    def __init__(self, url="", stationname="none", callback=None, client=None, retry_delay=15,
+                 errorlog="/tmp/log.txt", fallback=None):
+        self.url = url
+        self.stationname = stationname
+        self.callback = callback
+        self.fallback = fallback
+        self.error = None
+        self.title = None
+        if client is None:
+            client = HTTP_CLIENT
+        self.client = client
+        self.retry_delay = retry_delay
+        self.errorlog = errorlog
+        self._running = False
+        self._response = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Read the stream until `stop` is called"""
+        self._running = True
+        self._stop_event.clear()
+        while self._running:
+            try:
+                self.read_stream()
+            except Exception as e:
+                if self._running:
+                    self.error = "ICY metadata error: " + self.url + " " + str(e)
+                    open_log(self.errorlog).write(self.error, source='IcyMetadataReader')
+            if self._running:
+                self._stop_event.wait(self.retry_delay)
+
+    def read_stream(self):
+        """Open the stream once and report title changes until it ends"""
+        self._response = self.client.session.get(self.url, headers={"Icy-MetaData": "1"}, stream=True,
+                                                 timeout=(self.client.timeout[0], 30))
+        with self._response as response:
+            response.raise_for_status()
+            if "icy-metaint" not in response.headers:
+                self._no_metadata()
+                return
+            metaint = int(response.headers["icy-metaint"])
+            raw = response.raw
+            while self._running:
+                self._read_exactly(raw, metaint)
+                length = self._read_exactly(raw, 1)[0] * 16
+                if length > 0:
+                    self.handle_metadata(self._read_exactly(raw, length))
+
+    def handle_metadata(self, metadata):
+        """Call the callback if the `StreamTitle` in a metadata block changed
+
+        :param metadata: `bytes` of one metadata block
+        """
+        match = self.STREAM_TITLE.search(metadata)
+        if match is None:
+            return
+        try:
+            title = match.group(1).decode("utf-8")
+        except UnicodeDecodeError:
+            title = match.group(1).decode("latin-1")
+        title = title.strip()
+        if not title or title == self.title:
+            return
+        self.title = title
+        self.error = None
+        artist, track = onlineradiobox.split_song(title, self.stationname)
+        now = (datetime.datetime.now()) - datetime.datetime(1970, 1, 1)
+        if self.callback is not None:
+            self.callback(onlineradiobox.NowPlaying(artist=artist, title=track, timestamp=now.total_seconds()))
+
+    def _no_metadata(self):
+        """Stop reading a stream without metadata and let the `fallback` take over"""
+        self._running = False
+        self.error = "No ICY metadata in stream: " + self.url
+        open_log(self.errorlog).write(self.error, source='IcyMetadataReader', level='WARNING')
+        if self.fallback is not None:
+            self.fallback()
+
+    @staticmethod
+    def _read_exactly(raw, size):
+        data = b""
+        while len(data) < size:
+            chunk = raw.read(size - len(data))
+            if not chunk:
+                raise EOFError("stream ended")
+            data = data + chunk
+        return data
+
+    def is_running(self):
+        return self._running
+
+    def stop(self):
+        self._running = False
+        self._stop_event.set()
+        if self._response is not None:
+            self._response.close()
+
+
+class NowPlayingPrefetcher:
+    """Background now playing table of all channels
+
+    Every `interval` seconds the OnlineRadioBox pages of all channels are requested in a thread
+    pool of `max_workers` threads. Requests to the same host are at least `host_interval` seconds
+    apart. As all pages are on one host, a poll of many channels takes longer than `interval`, so
+    the polls are then `sweep_interval` seconds apart instead. The newest song of every channel
+    is kept in `table`, listeners subscribed to a channel are called whenever its song changes.
+    ICY channels are not polled, their `ChannelWriter` puts the songs of the stream into the table
+    via `update`, unless the stream has no metadata and the channel was handed to `add`. Channels without an OnlineRadioBox link are not polled.
+
+    Attributes:
+        channels: List of channel dictionaries
+        interval: Seconds between two polls of all channels
+        max_workers: Maximum number of requests running at the same time
+        host_interval: Minimum seconds between two requests to the same host
+        errorlog: .txt file to write any occuring errors to
+        table: Dictionary of channel id -> `NowPlaying` record of the newest song
+        _getters: Dictionary of channel id -> `SongGetter` of all polled channels
+        _listeners: Dictionary of channel id -> list of functions called with a new `NowPlaying` record
+        _errors: Dictionary of channel id -> last error, to log every error only once
+        _in_flight: Channel ids currently requested
+        _host_next: Dictionary of host -> `time.monotonic()` value of the next allowed request
+    """
+
+    def __init__(self, channels, interval=15, max_workers=3, host_interval=2, errorlog="/tmp/log.txt"):
+        self.channels = channels
+        self.interval = interval
+        self.max_workers = max_workers
+        self.host_interval = host_interval
+        self.errorlog = errorlog
+        self.table = {}
+        self._getters = {}
+        for channel in channels:
+            if channel.get('source', 'onlineradiobox') != 'icy' and channel.get('onlineradiobox'):
+                self._getters[channel['id']] = SongGetter(url=channel['onlineradiobox'], stationname=channel['name'])
+        self._listeners = {}
+        self._errors = {}
+        self._in_flight = set()
+        self._host_next = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = None
+        self._timer = None
+
+    def start(self):
+        self._stop_event.clear()
+        with self._lock:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+        self._timer = SCHEDULER.call_every(self.sweep_interval(), self.poll_all, first=0)
+
+    def sweep_interval(self):
+        """:return: Seconds between two polls, at least the time one poll of the busiest host takes"""
+        with self._lock:
+            hosts = Counter(urlparse(songgetter.url).netloc for songgetter in self._getters.values())
+        return max([self.interval] + [count * self.host_interval for count in hosts.values()])
+
+    def stop(self):
+        self._stop_event.set()
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def poll_all(self):
+        """Request the songs of all channels"""
+        with self._lock:
+            channel_ids = list(self._getters)
+        for channel_id in channel_ids:
+            self.refresh(channel_id)
+
+    def add(self, channel):
+        """Poll the OnlineRadioBox page of an ICY channel whose stream has no metadata
+
+        :param channel: Channel dictionary, nothing is done without an `onlineradiobox` link
+        """
+        if not channel.get('onlineradiobox'):
+            return
+        with self._lock:
+            if channel['id'] not in self._getters:
+                self._getters[channel['id']] = SongGetter(url=channel['onlineradiobox'],
+                                                          stationname=channel['name'])
+        if self._timer is not None:
+            self._timer.interval = self.sweep_interval()
+        self.refresh(channel['id'])
+
+    def polls(self, channel_id):
+        """:return: True if the OnlineRadioBox page of the channel is polled"""
+        with self._lock:
+            return channel_id in self._getters
+
+    def refresh(self, channel_id):
+        """Request the song of a channel unless it is requested already
+
+        :param channel_id: `id` of the channel dictionary
+        """
+        with self._lock:
+            if self._executor is None or channel_id not in self._getters or channel_id in self._in_flight:
+                return
+            self._in_flight.add(channel_id)
+            self._executor.submit(self._fetch, channel_id)
+
+    def _fetch(self, channel_id):
+        songgetter = self._getters[channel_id]
+        try:
+            self._wait_for_host(songgetter.url)
+            if self._stop_event.is_set():
+                return
+            songgetter.get_tracklist()
+            if songgetter.error is not None:
+                if self._errors.get(channel_id) != songgetter.error:
+                    open_log(self.errorlog).write(songgetter.error, source='NowPlayingPrefetcher')
+                self._errors[channel_id] = songgetter.error
+                return
+            self._errors.pop(channel_id, None)
+            if songgetter.tracklist[0]["title"] == "try":
+                # the page shows no song yet
+                return
+            self.update(channel_id, onlineradiobox.NowPlaying(**songgetter.tracklist[0]))
+        finally:
+            with self._lock:
+                self._in_flight.discard(channel_id)
+
+    def _wait_for_host(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = monotonic()
+            allowed = max(now, self._host_next.get(host, 0))
+            self._host_next[host] = allowed + self.host_interval
+        if allowed > now:
+            self._stop_event.wait(allowed - now)
+
+    def update(self, channel_id, now_playing):
+        """Store the song of a channel and tell the listeners if it changed
+
+        :param channel_id: `id` of the channel dictionary
+        :param now_playing: `NowPlaying` record
+        """
+        with self._lock:
+            previous = self.table.get(channel_id)
+            self.table[channel_id] = now_playing
+            listeners = list(self._listeners.get(channel_id, []))
+        if previous is not None and previous.artist == now_playing.artist and previous.title == now_playing.title:
+            return
+        for listener in listeners:
+            listener(now_playing)
+        EVENTS.publish('stations', self.snapshot())
+
+    def get(self, channel_id):
+        """:return: `NowPlaying` record of a channel or `None` if not known yet"""
+        with self._lock:
+            return self.table.get(channel_id)
+
+    def subscribe(self, channel_id, listener):
+        with self._lock:
+            self._listeners.setdefault(channel_id, []).append(listener)
+
+    def unsubscribe(self, channel_id, listener):
+        with self._lock:
+            if listener in self._listeners.get(channel_id, []):
+                self._listeners[channel_id].remove(listener)
+
+    def snapshot(self):
+        """All channels with their current song
+
+        :return: List of dictionaries containing `id`, `name`, `song` in channel order
+        """
+        with self._lock:
+            table = dict(self.table)
+        stations = []
+        for channel in self.channels:
+            now_playing = table.get(channel['id'])
+            stations.append({
+                'id': channel['id'],
+                'name': channel['name'],
+                'song': now_playing.artist + ' - ' + now_playing.title if now_playing is not None else ''
+            })
+        return stations
 
 
 class ChannelWriter:
     """Log class for current channel
 
     This class upon being started will check the last song for the current channel
-    by the SongGetter class
+    by the SongGetter class. Channels with `'source': 'icy'` receive their songs from the
+    stream itself by an IcyMetadataReader instead.
     The song gets written into the `current_channel_json`
     If a song was received, it will get scrobbled to last.fm.
     In case of any error during this process, the error will be written into the `logfile`
 
     Attributes:
         channel_dict: Dictionary of current channel containing the `onlineradiobox` attribute to
-           receive the song
+           receive the song. The optional `source` attribute selects where songs come from, either
+           `onlineradiobox` (default) or `icy`
         last_fm_doc: Dictionary with the fields 'api', 'api_secret', 'user', 'password'
         _running: True/False whether this is started already and checks for new song every 15 sec
         logfile: .txt file to log errors
         song: string containg the last played song
-        sleep_count: Check if 15 sec are over
+        interval: Seconds between two song checks
+        _timer: `Timer` of the song check registered at the `SCHEDULER`
         last_fm_scrobbler: LastFMRadioScrobble object - scrobble song
         songgetter: SongGetter object - receive song
+        icy_reader: IcyMetadataReader object - receive song from the stream
+        t_icy: threading.Thread object reading the stream of the icy_reader
         channel: CurrentChannel object - write song to disk
         current_channel_json: `json` file on disk to store current channel
+        scrobble_queue: ScrobbleQueue object - scrobble songs in the background
+        prefetcher: NowPlayingPrefetcher object - if given, songs are taken from its table instead of
+           polling the `songgetter`
     """
 
-    def __init__(self, channel_dict=None, last_fm_doc=None, logfile="", current_channel_json=''):
+    def __init__(self, channel_dict=None, last_fm_doc=None, logfile="", current_channel_json='', interval=15,
+                 scrobble_queue=None, prefetcher=None):
         if last_fm_doc is None:
             last_fm_doc = {}
         self.channel_dict = channel_dict
@@ -265,24 +1270,33 @@ class ChannelWriter:
         self._running = False
         self.song = "try"
         self.logfile = logfile
-        self.sleep_count = 0
+        self.interval = interval
+        self._timer = None
         self.last_fm_scrobbler = None
         self.songgetter = None
+        self.icy_reader = None
+        self.t_icy = None
         self.channel = None
         self.current_channel_json = current_channel_json
+        self.scrobble_queue = scrobble_queue
+        self.prefetcher = prefetcher
 
     def start(self):
         """
-        Run a loop to update channel info and scrobble songs
-
-        Returns: A While loop that tries every 20 seconds to derive the currently playing song. If there
-        is a song, the song will be sent to last.fm. In case the channel was changed by the user, the
-        information will be updated in the `self.channel` item.
+        Register a job to update channel info and scrobble songs
+
+        Returns: Nothing. The `SCHEDULER` tries every `self.interval` seconds to derive the currently
+        playing song. If there is a song, the song will be sent to last.fm. In case the channel was
+        changed by the user, the information will be updated in the `self.channel` item.
+        For ICY channels no job is registered, the `self.icy_reader` reports every new song. If the
+        stream has no metadata, the OnlineRadioBox page is polled instead. Channels without an
+        OnlineRadioBox link are not polled at all.
+        With a `self.prefetcher` no job is registered either, the song known by the prefetcher is
+        taken at once, the page of the channel is requested ahead of the next poll of all channels
+        and every change is reported by the prefetcher.
 
         """
-        self.last_fm_scrobbler = LastFMRadioScrobble(doc=self.last_fm_doc)
-        self.songgetter = SongGetter(url=self.channel_dict['onlineradiobox'],
-                                     stationname=self.channel_dict['name'])
+        self.last_fm_scrobbler = LastFMRadioScrobble(doc=self.last_fm_doc, queue=self.scrobble_queue)
         self.channel = CurrentChannel(
             radio=self.channel_dict['name'],
             id=self.channel_dict['id'],
@@ -290,13 +1304,58 @@ class ChannelWriter:
             json_file=self.current_channel_json
         )
         self.channel.write_json()
-        while self._running:
-            sleep(0.05)
-            if self.sleep_count > 300:
-                self.scrobble()
-                self.channel.write_json()
-                self.sleep_count = 0
-            self.sleep_count = self.sleep_count + 1
+        if not self._running:
+            return
+
+        # an ICY stream without metadata is polled like the other channels
+        is_icy = self.channel_dict.get('source', 'onlineradiobox') == 'icy' and \
+            not (self.prefetcher is not None and self.prefetcher.polls(self.channel_dict['id']))
+        if is_icy:
+            if self.prefetcher is not None:
+                callback = partial(self.prefetcher.update, self.channel_dict['id'])
+            else:
+                callback = self._on_song
+            self.icy_reader = IcyMetadataReader(url=self.channel_dict['stream'],
+                                                stationname=self.channel_dict['name'],
+                                                callback=callback,
+                                                errorlog=self.logfile,
+                                                fallback=self._poll_onlineradiobox)
+            self.t_icy = threading.Thread(target=self.icy_reader.start, daemon=True)
+            self.t_icy.start()
+
+        if self.prefetcher is not None:
+            self.prefetcher.subscribe(self.channel_dict['id'], self._on_song)
+            now_playing = self.prefetcher.get(self.channel_dict['id'])
+            if now_playing is not None:
+                self._on_song(now_playing)
+            # the cached song may be one sweep old, ask for the current one ahead of the sweep
+            self.prefetcher.refresh(self.channel_dict['id'])
+        elif not is_icy:
+            self._poll_onlineradiobox()
+
+    def _poll_onlineradiobox(self):
+        """Receive the songs from the OnlineRadioBox page, also if an ICY stream has no metadata"""
+        if not self._running or not self.channel_dict.get('onlineradiobox'):
+            return
+        if self.prefetcher is not None:
+            self.prefetcher.add(self.channel_dict)
+            return
+        self.songgetter = SongGetter(url=self.channel_dict['onlineradiobox'],
+                                     stationname=self.channel_dict['name'])
+        self._timer = SCHEDULER.call_every(self.interval, self._poll, blocking=True)
+
+    def _on_song(self, now_playing):
+        if not self._running:
+            return
+        self.update_song([now_playing._asdict()])
+        self.channel.write_json()
+
+    def _poll(self):
+        if not self._running:
+            self.stop()
+            return
+        self.scrobble()
+        self.channel.write_json()
 
     def set_running(self):
         sleep(0.02)
@@ -307,6 +1366,12 @@ class ChannelWriter:
 
     def stop(self):
         self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.icy_reader is not None:
+            self.icy_reader.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.unsubscribe(self.channel_dict['id'], self._on_song)
 
     def scrobble(self):
         """
@@ -322,33 +1387,188 @@ class ChannelWriter:
         """
         self.songgetter.get_tracklist()
         if self.songgetter.error is None:
-            if self.songgetter.tracklist[0]["title"] != self.song and self.songgetter.tracklist[0]["title"] != "try":
-                self.song = self.songgetter.tracklist[0]["title"]
-                try:
-                    song_playing = self.songgetter.tracklist[0]["artist"] + ' - ' + self.songgetter.tracklist[0][
-                        "title"]
-                    self.channel.set_song(song_playing)
-                except TypeError as e:
-                    with open(self.logfile, 'a') as f:
-                        f.write('OnlineRadioBox Error:' + str(e))
-                        for item in self.songgetter.tracklist:
-                            f.write("%s\n" % item)
-                        f.write("\n")
-
-                scrobble_info = self.last_fm_scrobbler.scrobble_from_json(in_dict=self.songgetter.tracklist,
-                                                                          indeces=[0],
-                                                                          has_timestamp=True)
-
-                if self.last_fm_scrobbler.has_error():
-                    with open(self.logfile, 'a') as f:
-                        f.write(self.last_fm_scrobbler.error)
-                        f.write("\n")
-                else:
-                    print(scrobble_info)
+            self.update_song(self.songgetter.tracklist)
         else:
-            with open(self.logfile, 'a') as f:
-                f.write(self.songgetter.error)
-                f.write("\n")
+            open_log(self.logfile).write(self.songgetter.error, source='ChannelWriter')
+
+    def update_song(self, tracklist):
+        """
+        Store and scrobble the first song of a tracklist if it is a new one
+
+        :param tracklist: Array of track dictionaries containing `title`, `artist`, `timestamp`
+        """
+        if tracklist[0]["title"] != self.song and tracklist[0]["title"] != "try":
+            self.song = tracklist[0]["title"]
+            try:
+                song_playing = tracklist[0]["artist"] + ' - ' + tracklist[0]["title"]
+                self.channel.set_song(song_playing)
+            except TypeError as e:
+                open_log(self.logfile).write('OnlineRadioBox Error:' + str(e) + "\n" +
+                                             "\n".join("%s" % item for item in tracklist),
+                                             source='ChannelWriter')
+
+            scrobble_info = self.last_fm_scrobbler.scrobble_from_json(in_dict=tracklist,
+                                                                      indeces=[0],
+                                                                      has_timestamp=True)
+
+            if self.last_fm_scrobbler.has_error():
+                open_log(self.logfile).write(self.last_fm_scrobbler.error, source='ChannelWriter')
+            else:
+                print(scrobble_info)
+
+
+class Mixer(ABC):
+    """Base class of the ALSA mixer backends
+
+    `set_volume` only remembers the wanted level. A job on the `SCHEDULER` writes it to the
+    mixer. Writes are serialized, a level set while a write is running waits for it and
+    only the latest wanted level is written afterwards.
+
+    Attributes:
+        control: Name of the ALSA mixer control, e.g. `Digital` of the HifiBerry AMP2
+        volume: Volume in percent last written to the mixer
+        closed: True once `close` was called, nothing is written afterwards
+        _wanted: Volume in percent to write next
+        _scheduled: Whether a write job is registered at the `SCHEDULER`
+    """
+
+    def __init__(self, control="Digital"):
+        self.control = control
+        self.volume = None
+        self.closed = False
+        self._wanted = None
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def set_volume(self, volume):
+        """Set the volume in the background
+
+        :param volume: Volume in percent, values above 100 are the maximum volume
+        """
+        with self._lock:
+            self._wanted = volume
+            if self._scheduled or self.closed:
+                return
+            self._scheduled = True
+        SCHEDULER.call_later(0, self.flush, blocking=True)
+
+    def flush(self):
+        """Write the latest wanted volume to the mixer"""
+        with self._write_lock:
+            with self._lock:
+                volume = self._wanted
+                self._scheduled = False
+            if self.closed or volume is None or volume == self.volume:
+                return
+            self.write(volume)
+            self.volume = volume
+
+    @abstractmethod
+    def write(self, volume):
+        """Write a volume in percent to the mixer control"""
+
+    def close(self):
+        """Stop writing, a write job still queued does nothing
+
+        Backends release their resources after calling this.
+        """
+        with self._write_lock:
+            self.closed = True
+
+
+class AmixerMixer(Mixer):
+    """Mixer backend using one long-lived `amixer -s` process
+
+    Instead of starting a shell, sudo and amixer for every change, `sset` commands are
+    written into the stdin of one amixer process. If it dies, it is started again.
+
+    Attributes:
+        command: Command to start amixer reading commands from stdin
+        process: subprocess.Popen process object of amixer
+    """
+
+    def __init__(self, control="Digital", command=("sudo", "amixer", "-s", "-q")):
+        super().__init__(control=control)
+        self.command = list(command)
+        self.process = None
+
+    def write(self, volume):
+        for _ in range(2):
+            if self.process is None or self.process.poll() is not None:
+                self.process = Popen(self.command, stdin=PIPE, stdout=DEVNULL, universal_newlines=True)
+            try:
+                self.process.stdin.write('sset "{control}" {volume}%\n'.format(control=self.control, volume=volume))
+                self.process.stdin.flush()
+                return
+            except (BrokenPipeError, OSError):
+                self.process = None
+
+    def close(self):
+        super().close()
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class AlsaMixer(Mixer):
+    """Mixer backend keeping one handle of `pyalsaaudio` open
+
+    Attributes:
+        mixer: `alsaaudio.Mixer` of the control
+    """
+
+    def __init__(self, control="Digital"):
+        super().__init__(control=control)
+        self.mixer = alsaaudio.Mixer(control)
+
+    def write(self, volume):
+        self.mixer.setvolume(min(int(volume), 100))
+
+    def close(self):
+        super().close()
+        self.mixer.close()
+
+
+class FakeMixer(Mixer):
+    """Mixer backend without any hardware, every volume written is recorded in `writes`"""
+
+    def __init__(self, control="Digital"):
+        super().__init__(control=control)
+        self.writes = []
+
+    def write(self, volume):
+        self.writes.append(volume)
+
+
+def open_mixer(control="Digital"):
+    """Mixer backend for a control, `AlsaMixer` if `pyalsaaudio` is installed, else `AmixerMixer`
+
+    On simulated hardware (see `hal`) it is a `FakeMixer`.
+    """
+    if hal.is_simulated():
+        return FakeMixer(control)
+    if alsaaudio is not None:
+        try:
+            return AlsaMixer(control)
+        except alsaaudio.ALSAAudioError as e:
+            print("ALSA mixer not available: " + str(e))
+    return AmixerMixer(control)
+
+
+def volume_table(steps=1024, max_volume=112, base=10):
+    """Perceptual volume for every step of the potentiometer
+
+    The knob position `x` (0-1) is mapped logarithmically to `max_volume * log_base(1 + (base - 1) * x)`.
+    With a `base` close to 1 the mapping gets linear.
+
+    :param steps: Number of steps of the ADC, 1024 for the 10 bit MCP3008
+    :param max_volume: Volume in percent at the end of the knob, everything above 100 is the maximum volume
+    :param base: Base of the logarithm
+    :return: List of the volume in percent for every step
+    """
+    return [int(round(max_volume * math.log(1 + (base - 1) * step / (steps - 1), base))) for step in range(steps)]
 
 
 class VolumeControl:
@@ -363,84 +1583,104 @@ class VolumeControl:
 
     Instead of controlling the volume directly, alsa-mixer is used
 
+    The potentiometer is read every `min_interval` seconds while it moves. After `idle_reads`
+    reads without movement, the time between two reads doubles up to `max_interval`, so an
+    untouched knob causes hardly any SPI traffic. Every read is smoothed by a median of the
+    last three values and an exponential moving average. The volume only changes if the
+    smoothed value moved more than `tolerance` away from the last applied one.
+
     Attributes:
         _running: Whether loop is started
-        last_read: Last read value
+        last_read: Last smoothed value applied to the mixer
         tolerance: to keep from being jittery we'll only change
-        mcp: MCP3008 controller
-        chan0: Analog Converter
+        chan0: Analog input channel of the MCP3008, see `hal.analog_in`
+        min_interval: Seconds between two reads while the potentiometer moves
+        max_interval: Seconds between two reads while the potentiometer is not touched
+        idle_reads: Reads without movement before slowing down
+        alpha: Weight of a new value in the exponential moving average
+        filtered: Smoothed potentiometer value
+        volume_table: List of the volume in percent for every 10 bit step of the MCP3008
+        _samples: The last three values read
+        _idle: Reads since the potentiometer last moved
+        _timer: `Timer` of the read registered at the `SCHEDULER`
+        mixer: `Mixer` object setting the volume of the `Digital` control
     """
 
-    def __init__(self, last_read=0, tolerance=250):
+    def __init__(self, last_read=0, tolerance=250, min_interval=0.025, max_interval=0.4, idle_reads=20,
+                 alpha=0.4, mixer=None):
         self._running = False
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_reads = idle_reads
+        self.alpha = alpha
+        self.filtered = None
+        self.volume_table = volume_table()
+        self._samples = deque(maxlen=3)
+        self._idle = 0
+        self._timer = None
+        if mixer is None:
+            mixer = open_mixer("Digital")
+        self.mixer = mixer
         self.last_read = last_read  # this keeps track of the last potentiometer value
-        self.tolerance = 250  # to keep from being jittery we'll only change
-        spi = busio.SPI(clock=board.SCK, MISO=board.MISO, MOSI=board.MOSI)
-
-        # create the cs (chip select)
-        cs = digitalio.DigitalInOut(board.D22)
+        self.tolerance = tolerance  # to keep from being jittery we'll only change
+        # analog input channel on pin 0 of the MCP3008
+        self.chan0 = hal.analog_in(0)
 
-        # create the mcp object
-        self.mcp = MCP.MCP3008(spi, cs)
-
-        # create an analog input channel on pin 0
-        self.chan0 = AnalogIn(self.mcp, MCP.P0)
+    def start(self):
+        """set volume
 
-    def remap_range(self, value, left_min, left_max, right_min, right_max):
-        """
-        this remaps a value from original (left) range to new (right) range
-        Figure out how 'wide' each range is
+        registers `read` at the `SCHEDULER` to check the potentiometer
 
-        :param value: input val
-        :param left_min: old min
-        :param left_max: old max
-        :param right_min: new min
-        :param right_max: new max
         :return:
         """
-        left_span = left_max - left_min
-        right_span = right_max - right_min
-
-        # Convert the left range into a 0-1 range (int)
-        valueScaled = int(value - left_min) / int(left_span)
+        if self._running:
+            self._idle = 0
+            self._timer = SCHEDULER.call_every(self.min_interval, self.read, first=0)
 
-        # Convert the 0-1 range into a value in the right range.
-        return int(right_min + (valueScaled * right_span))
-
-    def start(self):
+    def read(self):
         """set volume
 
-        controls the `sudo amixer sset "Digital" {volume}% > /dev/null'` command
-        and sets the volume to the SCP reader's current value
+        hands the SCP reader's current value to the `self.mixer`,
+        which sets the volume of the `Digital` control
 
         :return:
         """
-        while self._running:
-            # we'll assume that the pot didn't move
-            trim_pot_changed = False
-
-            # read the analog pin
-            trim_pot = self.chan0.value
-
-            # how much has it changed since the last read?
-            pot_adjust = abs(trim_pot - self.last_read)
+        if not self._running:
+            self.stop()
+            return
+
+        # read the analog pin and smooth it
+        trim_pot = self.chan0.value
+        self._samples.append(trim_pot)
+        median = sorted(self._samples)[len(self._samples) // 2]
+        if self.filtered is None:
+            self.filtered = median
+        else:
+            self.filtered = self.filtered + self.alpha * (median - self.filtered)
 
-            if pot_adjust > self.tolerance:
-                trim_pot_changed = True
+        # read fast while the knob moves, slow down while it is not touched
+        if abs(median - self.last_read) > self.tolerance:
+            self._idle = 0
+        else:
+            self._idle = self._idle + 1
+        if self._timer is not None:
+            if self._idle < self.idle_reads:
+                self._timer.interval = self.min_interval
+            else:
+                self._timer.interval = min(self._timer.interval * 2, self.max_interval)
 
-            if trim_pot_changed:
-                # convert 16bit adc0 (0-65535) trim pot read into 0-100 volume level
-                set_volume = self.remap_range(trim_pot, 0, 65535, 0, 112)
+        # how much has it changed since the last applied value?
+        if abs(self.filtered - self.last_read) > self.tolerance:
+            # convert 16bit adc0 (0-65535) trim pot read into 0-112 volume level
+            set_volume = self.volume_table[int(self.filtered) >> 6]
 
-                # set OS volume playback volume
-                # print('Volume = {volume}%'.format(volume=set_volume))
-                set_vol_cmd = 'sudo amixer sset "Digital" {volume}% > /dev/null' \
-                    .format(volume=set_volume)
-                os.system(set_vol_cmd)
+            # set OS volume playback volume
+            # print('Volume = {volume}%'.format(volume=set_volume))
+            self.mixer.set_volume(set_volume)
+            EVENTS.publish('volume', set_volume)
 
-                # save the potentiometer reading for the next loop
-                self.last_read = trim_pot
-            sleep(0.025)
+            # save the potentiometer reading for the next loop
+            self.last_read = self.filtered
 
     def is_running(self):
         return self._running
@@ -450,6 +1690,36 @@ class VolumeControl:
 
     def stop(self):
         self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+        self.mixer.close()
+
+
+class StartEvent(threading.Event):
+    """`threading.Event` that also calls the functions registered by `when_set` once it is set
+
+    The functions run in the thread setting the event, so they must be quick.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+        with self._callbacks_lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def when_set(self, callback):
+        """Call `callback()` once the event is set, at once if it is set already"""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
 
 
 class Player:
@@ -460,30 +1730,86 @@ class Player:
 
     On stop it will kill the process
 
+    A player started with a `dbus_name` can change its volume while playing, see
+    `set_volume`. Its output is watched to know when the audio started.
+
     Attributes:
         process: subprocess.Popen process object
         mp3: string with the link of the mp3
         _running: True/False whether it was started
         errorlog: .txt file to write any occuring errors to
+        volume: Linear volume (0-1) of the player, `None` for the omxplayer default
+        dbus_name: D-Bus name of the omxplayer to control it while playing
+        audio_started: StartEvent set as soon as omxplayer started to decode audio
+        audio_started_at: `time.monotonic()` value when the audio started
 
     """
+    MUTED = 0.001
 
-    def __init__(self, mp3, errorlog="/tmp/log.txt"):
+    def __init__(self, mp3, errorlog="/tmp/log.txt", volume=None, dbus_name=None):
         self.process = None
         self.mp3 = mp3
         self._running = False
         self.errorlog = errorlog
+        self.volume = volume
+        self.dbus_name = dbus_name
+        self.audio_started = StartEvent()
+        self.audio_started_at = None
 
     def start(self):
         self.set_running()
+        command = ['omxplayer', "-o", "alsa"]
+        if self.volume is not None:
+            command = command + ['--vol', str(self._millibel(self.volume))]
+        if self.dbus_name is not None:
+            command = command + ['--dbus_name', self.dbus_name]
+        command.append(self.mp3)
         try:
-            self.process = Popen(['omxplayer', "-o", "alsa", self.mp3], preexec_fn=os.setsid)
+            if self.dbus_name is None:
+                self.process = Popen(command, preexec_fn=os.setsid)
+            else:
+                # line buffered output to see the start of the audio at once
+                if STDBUF is not None:
+                    command = [STDBUF, '-oL'] + command
+                self.process = Popen(command, preexec_fn=os.setsid, stdout=PIPE, universal_newlines=True)
+                threading.Thread(target=self._watch_output, daemon=True).start()
         except Exception as e:
             print('Player not started')
-            with open(self.errorlog, 'a') as f:
-                f.write('Player Start Error: ' + self.mp3)
-                f.write(str(e))
-                f.write("\n")
+            open_log(self.errorlog).write('Player Start Error: ' + self.mp3 + str(e), source='Player')
+
+    def _watch_output(self):
+        for line in self.process.stdout:
+            if not self.audio_started.is_set() and line.startswith('Audio codec'):
+                self.audio_started_at = monotonic()
+                self.audio_started.set()
+
+    @staticmethod
+    def _millibel(volume):
+        return int(2000 * math.log10(max(volume, Player.MUTED)))
+
+    def set_volume(self, volume):
+        """Change the volume of a running player over D-Bus
+
+        :param volume: Linear volume from 0 to 1, `Player.MUTED` to mute it
+        """
+        self.volume = volume
+        if self.dbus_name is None or not self.is_alive():
+            return
+        env = dict(os.environ)
+        try:
+            # omxplayer stores the address of its session bus here
+            with open('/tmp/omxplayerdbus.' + getpass.getuser()) as f:
+                env['DBUS_SESSION_BUS_ADDRESS'] = f.read().strip()
+        except OSError:
+            pass
+        call(['dbus-send', '--print-reply=literal', '--session', '--reply-timeout=500',
+              '--dest=' + self.dbus_name, '/org/mpris/MediaPlayer2',
+              'org.freedesktop.DBus.Properties.Volume', 'double:' + str(max(volume, Player.MUTED))],
+             env=env, stdout=DEVNULL, stderr=DEVNULL)
+
+    def is_alive(self):
+        """Whether the omxplayer process is still playing"""
+        return self.process is not None and self.process.poll() is None
 
     def stop(self):
         """Kill current player
@@ -493,8 +1819,7 @@ class Player:
         try:
             os.killpg(self.process.pid, signal.SIGTERM)
         except:
-            with open(self.errorlog, 'a') as f:
-                f.write('Player Stop Error: ' + self.mp3)
+            open_log(self.errorlog).write('Player Stop Error: ' + self.mp3, source='Player')
             print("Killing of a Player not succesful")
         self._running = False
 
@@ -505,6 +1830,774 @@ class Player:
         self._running = True
 
 
+class PlayerBackend(ABC):
+    """Base class of a long-lived audio backend playing one stream at a time
+
+    Instead of one process per `Player`, all `BackendPlayer` objects share one backend.
+    The backend knows which player it plays for, so a player that is not heard anymore
+    cannot stop the stream of another one.
+
+    Attributes:
+        errorlog: .txt file to write any occuring errors to
+        current: The BackendPlayer currently played or `None`
+        mixes: True if the backend plays several players at once, so muted standby players can be used
+    """
+    mixes = False
+
+    def __init__(self, errorlog="/tmp/log.txt"):
+        self.errorlog = errorlog
+        self.current = None
+        self._lock = threading.RLock()
+
+    def play(self, player):
+        """Play the stream of a player instead of the current one"""
+        with self._lock:
+            self.current = player
+            self.load(player.mp3, loop=player.loop)
+            self.set_volume(1.0 if player.volume is None else player.volume)
+
+    def release(self, player):
+        """Stop playing if the player is still the current one"""
+        with self._lock:
+            if self.current is player:
+                self.current = None
+                self.unload()
+
+    def set_player_volume(self, player, volume):
+        with self._lock:
+            if self.current is player:
+                self.set_volume(volume)
+
+    def is_playing(self, player):
+        return self.current is player and self.is_alive()
+
+    def noise_player(self, errorlog="/tmp/log.txt"):
+        """:return: A BackendPlayer playing noise in between channels"""
+        return BackendPlayer(noise_file(), self, errorlog, loop=True)
+
+    def audio_started(self):
+        """Called by the backend as soon as the audio of the current player started"""
+        player = self.current
+        if player is not None:
+            player.audio_started_at = monotonic()
+            player.audio_started.set()
+
+    @abstractmethod
+    def load(self, url, loop=False):
+        """Play a stream instead of the one played now"""
+
+    @abstractmethod
+    def unload(self):
+        """Stop playing, the backend stays idle"""
+
+    @abstractmethod
+    def set_volume(self, volume):
+        """Set the linear volume (0-1) of the stream played"""
+
+    @abstractmethod
+    def state(self):
+        """:return: Dictionary describing what the backend plays"""
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class MpvBackend(PlayerBackend):
+    """One mpv process for the lifetime of the radio, controlled over its JSON IPC socket
+
+    mpv is started idle with `--input-ipc-server`. Streams are switched by `loadfile`,
+    the audio start is reported by the `playback-restart` event. If mpv dies, it is
+    started again with the next command.
+
+    Attributes:
+        socket_path: Location of the IPC socket
+        command: Command starting mpv
+        timeout: Seconds to wait for the reply of a command
+        process: subprocess.Popen process object of mpv
+    """
+
+    def __init__(self, errorlog="/tmp/log.txt", socket_path="/tmp/radioflask-mpv.sock", command=None, timeout=2):
+        super().__init__(errorlog=errorlog)
+        self.socket_path = socket_path
+        if command is None:
+            command = ['mpv', '--idle=yes', '--no-video', '--no-terminal', '--ao=alsa',
+                       '--input-ipc-server=' + socket_path]
+        self.command = command
+        self.timeout = timeout
+        self.process = None
+        self._socket = None
+        self._replies = {}
+        self._request_ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+
+    def start(self):
+        """Start mpv and connect to its socket unless already done"""
+        with self._send_lock:
+            if self.is_alive() and self._socket is not None:
+                return
+            if not self.is_alive():
+                self.process = Popen(self.command, stdout=DEVNULL, stderr=DEVNULL)
+            deadline = monotonic() + 5
+            while True:
+                try:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.socket_path)
+                    break
+                except OSError:
+                    sock.close()
+                    if monotonic() > deadline or not self.is_alive():
+                        raise
+                    sleep(0.05)
+            self._socket = sock
+            threading.Thread(target=self._read, args=(sock,), daemon=True).start()
+
+    def _read(self, sock):
+        buffer = b""
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            buffer = buffer + data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                try:
+                    message = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                if message.get("event") == "playback-restart":
+                    self.audio_started()
+                elif "request_id" in message and message["request_id"] in self._replies:
+                    event, _ = self._replies[message["request_id"]]
+                    self._replies[message["request_id"]] = (event, message)
+                    event.set()
+        with self._send_lock:
+            if self._socket is sock:
+                self._socket = None
+
+    def send(self, *command):
+        """Send a command to mpv and wait for its reply
+
+        :return: The `data` of the reply
+        :raises OSError: if mpv cannot be reached
+        :raises RuntimeError: if mpv answered with an error
+        """
+        self.start()
+        request_id = next(self._request_ids)
+        event = threading.Event()
+        self._replies[request_id] = (event, None)
+        try:
+            with self._send_lock:
+                self._socket.sendall(json.dumps({"command": list(command), "request_id": request_id}).encode("utf-8")
+                                     + b"\n")
+            if not event.wait(self.timeout):
+                raise OSError("mpv did not answer " + str(command))
+            reply = self._replies[request_id][1]
+        finally:
+            self._replies.pop(request_id, None)
+        if reply.get("error") != "success":
+            raise RuntimeError("mpv " + str(command) + ": " + str(reply.get("error")))
+        return reply.get("data")
+
+    def load(self, url, loop=False):
+        self.send("set_property", "loop-file", "inf" if loop else "no")
+        self.send("loadfile", url, "replace")
+
+    def unload(self):
+        self.send("stop")
+
+    def set_volume(self, volume):
+        self.send("set_property", "mute", volume <= Player.MUTED)
+        self.send("set_property", "volume", round(volume * 100, 1))
+
+    def state(self):
+        return {
+            'idle': self.send("get_property", "idle-active"),
+            'url': self.send("get_property", "path") if self.current is not None else None,
+            'volume': self.send("get_property", "volume"),
+            'mute': self.send("get_property", "mute")
+        }
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        try:
+            self.send("quit")
+        except (OSError, RuntimeError):
+            pass
+        if self.process is not None:
+            self.process.wait()
+            self.process = None
+
+
+class FakePlayerBackend(PlayerBackend):
+    """Player backend without any audio, to run and test the radio on every machine
+
+    It behaves like `MpvBackend`: the audio of a loaded stream starts after `audio_delay`
+    seconds. Every call is recorded in `commands`.
+
+    Attributes:
+        audio_delay: Seconds from loading a stream to its audio start
+        commands: List of tuples of all calls
+        url: Stream currently loaded or `None`
+        volume: Current volume
+    """
+
+    def __init__(self, errorlog="/tmp/log.txt", audio_delay=0):
+        super().__init__(errorlog=errorlog)
+        self.audio_delay = audio_delay
+        self.commands = []
+        self.url = None
+        self.volume = 1.0
+
+    def load(self, url, loop=False):
+        self.commands.append(("load", url, loop))
+        self.url = url
+        if self.audio_delay > 0:
+            SCHEDULER.call_later(self.audio_delay, self._started, self.current)
+        else:
+            self.audio_started()
+
+    def _started(self, player):
+        if self.current is player:
+            self.audio_started()
+
+    def unload(self):
+        self.commands.append(("unload",))
+        self.url = None
+
+    def set_volume(self, volume):
+        self.commands.append(("volume", volume))
+        self.volume = volume
+
+    def state(self):
+        return {
+            'idle': self.url is None,
+            'url': self.url,
+            'volume': self.volume * 100,
+            'mute': self.volume <= Player.MUTED
+        }
+
+
+class StreamDecoder:
+    """ffmpeg process decoding a stream into PCM for the `MixingBackend`
+
+    A reader thread keeps the last `MixingBackend.BUFFER_PERIODS` periods of audio. Older
+    periods are dropped, so a muted decoder is always close to live when it becomes audible.
+
+    Attributes:
+        player: BackendPlayer the stream is decoded for
+        process: subprocess.Popen process object of ffmpeg
+        periods: `collections.deque` of `numpy` arrays with one period of stereo samples each
+        gain: Gain the last period was mixed with
+    """
+
+    def __init__(self, player, period, errorlog="/tmp/log.txt"):
+        self.player = player
+        self.period = period
+        self.errorlog = errorlog
+        self.periods = deque(maxlen=MixingBackend.BUFFER_PERIODS)
+        self.gain = 0.0
+        command = ['ffmpeg', '-nostdin', '-loglevel', 'error']
+        if player.loop:
+            command = command + ['-stream_loop', '-1']
+        command = command + ['-i', player.mp3, '-f', 's16le', '-ac', '2', '-ar', str(MixingBackend.RATE), 'pipe:1']
+        self.process = Popen(command, stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        size = self.period * 4
+        stdout = self.process.stdout
+        while True:
+            data = stdout.read(size)
+            if len(data) < size:
+                break
+            self.periods.append(np.frombuffer(data, dtype=np.int16).reshape(-1, 2))
+            if not self.player.audio_started.is_set():
+                self.player.audio_started_at = monotonic()
+                self.player.audio_started.set()
+        if self.process.poll() not in (None, 0):
+            open_log(self.errorlog).write('Decoder stopped: ' + self.player.mp3, source='StreamDecoder')
+
+    def read(self):
+        """:return: The oldest period buffered or `None` if nothing is buffered"""
+        try:
+            return self.periods.popleft()
+        except IndexError:
+            return None
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.is_alive():
+            self.process.kill()
+        self.process.wait()
+
+
+class MixingBackend(PlayerBackend):
+    """Mixes noise and all stations into one ALSA output, like the tuning of an analogue radio
+
+    The noise is generated once at the start, no file and no process is needed for it.
+    Every player gets a `StreamDecoder`, standby players keep decoding muted. One output thread
+    mixes a period at a time and writes it to ALSA by `pyalsaaudio`, or to one `aplay` process
+    if it is not installed. Gains are ramped over a period, so changes never click.
+
+    `tune` sets the station the dial is closest to and how close it is. That station is mixed
+    with `tuning`, the noise with `1 - tuning`.
+
+    Attributes:
+        device: ALSA device to write to
+        noise_level: Gain of the noise far away from any channel
+        voices: Dictionary of BackendPlayer -> StreamDecoder
+        noise: BackendPlayer that lets the noise be heard or `None`
+        tuned: Stream url of the channel closest to the dial or `None`
+        tuning: 1 on the channel `tuned`, down to 0 far away from it
+    """
+    mixes = True
+    NOISE = 'noise://'
+    RATE = 44100
+    PERIOD = 1024
+    BUFFER_PERIODS = 16
+
+    def __init__(self, errorlog="/tmp/log.txt", device="default", noise_level=0.3):
+        super().__init__(errorlog=errorlog)
+        self.device = device
+        self.noise_level = noise_level
+        self.voices = {}
+        self.noise = None
+        self.tuned = None
+        self.tuning = 1.0
+        self._noise_gain = 0.0
+        self._hiss = self._generate_noise()
+        self._hiss_position = 0
+        self._running = False
+        self._thread = None
+        self._output = None
+        self._output_close = None
+
+    @classmethod
+    def _generate_noise(cls, seconds=3):
+        """Hiss of a detuned radio: white noise, slightly low-pass filtered, scaled to 16 bit"""
+        white = np.random.default_rng().standard_normal((cls.RATE * seconds, 2))
+        kernel = np.ones(4) / 4
+        hiss = np.column_stack([np.convolve(white[:, i], kernel, mode='same') for i in range(2)])
+        return (hiss / np.abs(hiss).max() * 32767).astype(np.float32)
+
+    def start(self):
+        """Open the output and start mixing unless already done"""
+        with self._lock:
+            if self._running:
+                return
+            # the output of a mix thread stopped by an error is still open
+            self._close_output()
+            self._output, self._output_close = self._open_output()
+            self._running = True
+            self._thread = threading.Thread(target=self._mix, name="mixer", daemon=True)
+            self._thread.start()
+
+    def _open_output(self):
+        """:return: Tuple of the functions writing to and closing the ALSA output"""
+        if alsaaudio is not None:
+            pcm = alsaaudio.PCM(alsaaudio.PCM_PLAYBACK, device=self.device, channels=2, rate=self.RATE,
+                                format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=self.PERIOD)
+            return pcm.write, pcm.close
+        process = Popen(['aplay', '-q', '-D', self.device, '-t', 'raw', '-f', 'S16_LE', '-c', '2',
+                         '-r', str(self.RATE)], stdin=PIPE)
+
+        def close():
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+            process.wait()
+        return process.stdin.write, close
+
+    def _close_output(self):
+        if self._output_close is not None:
+            try:
+                self._output_close()
+            except Exception as e:
+                open_log(self.errorlog).write('Mixer Output Close Error: ' + str(e), source='MixingBackend')
+        self._output = None
+        self._output_close = None
+
+    def play(self, player):
+        self.start()
+        with self._lock:
+            if player.mp3 == self.NOISE:
+                self.noise = player
+                player.audio_started_at = monotonic()
+                player.audio_started.set()
+                return
+            voice = self.voices.pop(player, None)
+            if voice is not None:
+                voice.stop()
+            self.voices[player] = StreamDecoder(player, self.PERIOD, self.errorlog)
+            if player.volume is None or player.volume > Player.MUTED:
+                self.current = player
+
+    def release(self, player):
+        with self._lock:
+            if self.noise is player:
+                self.noise = None
+                return
+            if self.current is player:
+                self.current = None
+            voice = self.voices.pop(player, None)
+        if voice is not None:
+            voice.stop()
+
+    def set_player_volume(self, player, volume):
+        with self._lock:
+            if volume > Player.MUTED:
+                self.current = player
+            elif self.current is player:
+                self.current = None
+
+    def is_playing(self, player):
+        if player is self.noise:
+            return True
+        voice = self.voices.get(player)
+        return voice is not None and voice.is_alive()
+
+    def noise_player(self, errorlog="/tmp/log.txt"):
+        return BackendPlayer(self.NOISE, self, errorlog)
+
+    def load(self, url, loop=False):
+        """Play a stream on a player of its own instead of the current one"""
+        self.unload()
+        self.play(BackendPlayer(url, self, self.errorlog, loop=loop))
+
+    def unload(self):
+        """Stop the current player, standby players and the noise keep playing"""
+        with self._lock:
+            player = self.current
+        if player is not None:
+            self.release(player)
+
+    def set_volume(self, volume):
+        with self._lock:
+            player = self.current
+        if player is not None:
+            player.volume = volume
+            self.set_player_volume(player, volume)
+
+    def tune(self, stream, tuning):
+        """Set the channel the dial is closest to
+
+        :param stream: Stream url of the channel or `None`
+        :param tuning: 1 on the channel, down to 0 far away from it
+        """
+        self.tuned = stream
+        self.tuning = tuning
+
+    def _gain(self, player):
+        if player.mp3 == self.tuned:
+            return self.tuning
+        if player.volume is None:
+            return 1.0
+        return player.volume if player.volume > Player.MUTED else 0.0
+
+    def _next_hiss(self):
+        if self._hiss_position + self.PERIOD > len(self._hiss):
+            # jump to a random place, so the loop of the hiss cannot be heard
+            self._hiss_position = random.randrange(0, len(self._hiss) - self.PERIOD)
+        hiss = self._hiss[self._hiss_position:self._hiss_position + self.PERIOD]
+        self._hiss_position = self._hiss_position + self.PERIOD
+        return hiss
+
+    def _mix(self):
+        while self._running:
+            with self._lock:
+                voices = [(voice, self._gain(player)) for player, voice in self.voices.items()]
+                noise_gain = self.noise_level * (1 - self.tuning) if self.noise is not None else 0.0
+            mixed = np.zeros((self.PERIOD, 2), dtype=np.float32)
+            for voice, gain in voices:
+                samples = voice.read()
+                if samples is not None and (gain > 0 or voice.gain > 0):
+                    mixed += samples * np.linspace(voice.gain, gain, self.PERIOD, dtype=np.float32)[:, None]
+                voice.gain = gain
+            if noise_gain > 0 or self._noise_gain > 0:
+                mixed += self._next_hiss() * np.linspace(self._noise_gain, noise_gain, self.PERIOD,
+                                                         dtype=np.float32)[:, None]
+            self._noise_gain = noise_gain
+            try:
+                self._output(np.clip(mixed, -32768, 32767).astype(np.int16).tobytes())
+            except Exception as e:
+                open_log(self.errorlog).write('Mixer Output Error: ' + str(e), source='MixingBackend')
+                self._running = False
+
+    def state(self):
+        return {
+            'idle': not self.voices and self.noise is None,
+            'url': self.current.mp3 if self.current is not None else None,
+            'volume': self._gain(self.current) * 100 if self.current is not None else 0,
+            'mute': self.current is None,
+            'tuned': self.tuned,
+            'tuning': self.tuning,
+            'streams': [player.mp3 for player in self.voices]
+        }
+
+    def is_alive(self):
+        return self._running
+
+    def close(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close_output()
+        for voice in self.voices.values():
+            voice.stop()
+        self.voices = {}
+
+
+class BackendPlayer:
+    """Player using a shared `PlayerBackend` instead of an own omxplayer process
+
+    It has the same methods as `Player`, so it can be used everywhere a `Player` is used.
+
+    Attributes:
+        mp3: string with the link of the mp3
+        backend: PlayerBackend playing the stream
+        errorlog: .txt file to write any occuring errors to
+        volume: Linear volume (0-1) of the player
+        loop: Whether the file is played in an endless loop
+        _running: True/False whether it was started
+        audio_started: StartEvent set as soon as the audio started
+        audio_started_at: `time.monotonic()` value when the audio started
+    """
+
+    def __init__(self, mp3, backend, errorlog="/tmp/log.txt", volume=None, loop=False):
+        self.mp3 = mp3
+        self.backend = backend
+        self.errorlog = errorlog
+        self.volume = volume
+        self.loop = loop
+        self._running = False
+        self.audio_started = StartEvent()
+        self.audio_started_at = None
+
+    def start(self):
+        self.set_running()
+        self.audio_started.clear()
+        try:
+            self.backend.play(self)
+        except Exception as e:
+            print('Player not started')
+            open_log(self.errorlog).write('Player Start Error: ' + self.mp3 + str(e), source='Player')
+
+    def stop(self):
+        try:
+            self.backend.release(self)
+        except Exception as e:
+            open_log(self.errorlog).write('Player Stop Error: ' + self.mp3 + " " + str(e), source='Player')
+        self._running = False
+
+    def set_volume(self, volume):
+        self.volume = volume
+        try:
+            self.backend.set_player_volume(self, volume)
+        except Exception as e:
+            open_log(self.errorlog).write('Player Volume Error: ' + self.mp3 + " " + str(e), source='Player')
+
+    def is_alive(self):
+        return self.backend.is_playing(self)
+
+    def is_running(self):
+        return self._running
+
+    def set_running(self):
+        self._running = True
+
+
+def open_player_backend(name, errorlog="/tmp/log.txt"):
+    """Player backend by name
+
+    :param name: `omxplayer` (one process per player, returns `None`), `mpv`, `mix` or `fake`
+    :return: A PlayerBackend or `None`
+    """
+    if name == 'mpv':
+        return MpvBackend(errorlog=errorlog)
+    if name == 'mix':
+        return MixingBackend(errorlog=errorlog)
+    if name == 'fake':
+        return FakePlayerBackend(errorlog=errorlog)
+    return None
+
+
+class PlayerPool:
+    """Player of the current channel plus muted standby players of its neighbours
+
+    Connecting to a stream, buffering and starting the decoder takes a while. To not do this
+    on every switch, the streams of the channels next to the current one are already played
+    muted. Switching to one of them only needs to unmute it. Standby players are changed
+    by D-Bus and need an ALSA device that mixes several streams (e.g. dmix).
+
+    The number of standby players is limited by `max_standby` and by the bandwidth they may
+    use, `budget_kbps` for streams of about `stream_kbps` each. Without an ALSA device that mixes,
+    the muted player of the last channel would keep the sound card, so standby players are only
+    used by default with a backend that `mixes`.
+    The time from a switch to the first audio is kept in `latencies`.
+
+    With a `backend`, all players share it. Standby players are only used if the backend `mixes`.
+    Volumes are changed outside of the lock, a D-Bus call of omxplayer may take a while.
+
+    Attributes:
+        errorlog: .txt file to write any occuring errors to
+        max_standby: Maximum number of standby players, 0 switches the standby players off
+        budget_kbps: Bandwidth in kbit/s all standby players may use together
+        stream_kbps: Bandwidth in kbit/s of one stream
+        active: The Player currently heard or `None`
+        standby: Dictionary of stream url -> muted Player
+        latencies: The last switch-to-first-audio latencies in seconds
+        backend: PlayerBackend shared by all players, `None` for one omxplayer process per player
+    """
+    STANDBY = 2
+
+    def __init__(self, errorlog="/tmp/log.txt", max_standby=None, budget_kbps=512, stream_kbps=128, backend=None):
+        """
+        :param max_standby: Maximum number of standby players, `None` for `STANDBY` with a backend that
+          mixes and none otherwise. Set it for omxplayer only if ALSA mixes several streams (dmix).
+        """
+        if max_standby is None:
+            max_standby = self.STANDBY if getattr(backend, 'mixes', False) else 0
+        self.errorlog = errorlog
+        self.backend = backend
+        self.max_standby = max_standby
+        self.budget_kbps = budget_kbps
+        self.stream_kbps = stream_kbps
+        self.active = None
+        self.standby = {}
+        self.latencies = deque(maxlen=100)
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def standby_limit(self):
+        """Number of standby players allowed by `max_standby` and the bandwidth budget"""
+        if self.backend is not None and not self.backend.mixes:
+            return 0
+        return max(0, min(self.max_standby, self.budget_kbps // self.stream_kbps))
+
+    def _new_player(self, stream, volume):
+        if self.backend is not None:
+            player = BackendPlayer(stream, self.backend, self.errorlog, volume=volume)
+            player.start()
+            return player
+        player = Player(stream, self.errorlog, volume=volume,
+                        dbus_name='org.mpris.MediaPlayer2.omxplayer.radio' + str(next(self._counter)))
+        player.start()
+        return player
+
+    def activate(self, stream, neighbours=()):
+        """Let a stream be heard, prefer a standby player of it
+
+        :param stream: Stream url of the channel to play
+        :param neighbours: Stream urls of the channels next to it, most likely next one first
+        :return: The active Player
+        """
+        switched_at = monotonic()
+        released = None
+        dead = None
+        with self._lock:
+            if self.active is not None and self.active.mp3 != stream:
+                released = self._release()
+            if self.active is not None:
+                player = self.active
+            else:
+                player = self.standby.pop(stream, None)
+            started = player is None or not player.is_alive()
+            if started:
+                dead = player
+                player = self._new_player(stream, 1.0)
+            self.active = player
+        self._park(released)
+        if dead is not None:
+            dead.stop()
+        if not started:
+            player.set_volume(1.0)
+        self._measure(player, switched_at)
+        self.prepare(neighbours)
+        return player
+
+    def release(self):
+        """Mute the active player and keep it as standby player"""
+        with self._lock:
+            player = self._release()
+        self._park(player)
+
+    def _release(self):
+        player = self.active
+        self.active = None
+        return player
+
+    def _park(self, player):
+        """Mute a released player and keep it as standby player, or stop it"""
+        if player is None:
+            return
+        if self.standby_limit() > 0 and player.is_alive():
+            player.set_volume(Player.MUTED)
+            with self._lock:
+                keep = player.mp3 not in self.standby and (self.active is None or self.active.mp3 != player.mp3)
+                if keep:
+                    self.standby[player.mp3] = player
+            if keep:
+                return
+        player.stop()
+
+    def prepare(self, neighbours):
+        """Start muted players for the neighbours, stop all other standby players
+
+        :param neighbours: Stream urls, most likely next one first
+        """
+        with self._lock:
+            wanted = [stream for stream in neighbours
+                      if self.active is None or stream != self.active.mp3][:self.standby_limit()]
+            for stream in list(self.standby):
+                if stream not in wanted or not self.standby[stream].is_alive():
+                    self.standby.pop(stream).stop()
+            for stream in wanted:
+                if stream not in self.standby:
+                    self.standby[stream] = self._new_player(stream, Player.MUTED)
+
+    def _measure(self, player, switched_at):
+        if player.audio_started.is_set():
+            self._record(monotonic() - switched_at)
+        else:
+            threading.Thread(target=self._wait_for_audio, args=(player, switched_at), daemon=True).start()
+
+    def _wait_for_audio(self, player, switched_at):
+        if player.audio_started.wait(30):
+            self._record(player.audio_started_at - switched_at)
+
+    def _record(self, latency):
+        self.latencies.append(latency)
+        print("Switch to first audio: {:.3f} s".format(latency))
+
+    def stop(self):
+        """Stop the active and all standby players"""
+        with self._lock:
+            if self.active is not None:
+                self.active.stop()
+                self.active = None
+            for player in self.standby.values():
+                player.stop()
+            self.standby = {}
+
+
+def noise_file():
+    """One of the white noise MP3s played in between channels"""
+    noise = random.randrange(1, 3, 2)
+    return '/home/pi/share/radioflask/0' + str(noise) + '-White-Noise-10min.mp3'
+
+
 class NoisePlayer(Player):
     """Player attached to fixed MP3
 
@@ -513,8 +2606,7 @@ class NoisePlayer(Player):
     """
 
     def __init__(self):
-        noise = random.randrange(1, 3, 2)
-        super().__init__(mp3='/home/pi/share/radioflask/0' + str(noise) + '-White-Noise-10min.mp3')
+        super().__init__(mp3=noise_file())
 
     def stop(self):
         super().stop()
@@ -524,60 +2616,88 @@ class Blinker:
     """ LED Blinking
 
     This does 2 things:
-        1: upon start it lets an LED blink by switching ON/OFF
-        2. upon start a NoisePlayer object is started in a separate thread
+        1: upon start it lets an LED blink, driven by the PWM of RPi.GPIO
+        2. upon start a NoisePlayer object is started
+
+    The LED is switched on at a LOW output, so the duty cycle of the PWM is the share of
+    the period the LED is off. Changing a pattern only changes frequency and duty cycle,
+    no thread is needed to blink.
 
     Attributes:
             ledpin: the GPIO Pin ID of the LED
-            noise: A NoisePlayer object to play Noise
-            t1: Thread for the NoisePlayer
+            noise: A NoisePlayer (or BackendPlayer) object to play Noise
             _running: whether the start was activated
+            interval: Seconds between two LED switches while tuning
+            patterns: Dictionary of pattern name to `(frequency, lit)` with the frequency in Hz
+              and the percentage of the period the LED is on
+            pattern: Name of the pattern shown, `on` or `off` if the LED does not blink
+            _pwm: `GPIO.PWM` object of the LED
     """
-
-    def __init__(self, ledpin):
+    PATTERNS = {
+        # between two channels
+        'tuning': (10, 50),
+        # a channel was found, its audio did not start yet
+        'buffering': (2, 50),
+        # the audio of a channel did not start
+        'error': (1, 10),
+    }
+
+    def __init__(self, ledpin, interval=0.05, noise=None):
         self.ledpin = ledpin
         GPIO.setup(ledpin, GPIO.OUT)
-        self.noise = NoisePlayer()
-        self.t1 = None
+        if noise is None:
+            noise = NoisePlayer()
+        self.noise = noise
         self._running = False
+        self.interval = interval
+        self.patterns = dict(self.PATTERNS, tuning=(1 / (2 * interval), 50))
+        self.pattern = 'off'
+        self._pwm = GPIO.PWM(ledpin, self.patterns['tuning'][0])
+        self._pwm.start(100)
 
     def start(self):
-        # Start NoisePlayer in separate thread
+        # Start NoisePlayer, it only launches a process
         if not self.noise.is_running():
-            if self.t1 is not None:
-                if not self.t1.is_alive():
-                    self.t1 = threading.Thread(target=self.noise.start)
-                    self.t1.start()
-            else:
-                self.t1 = threading.Thread(target=self.noise.start)
-                self.t1.start()
+            self.noise.start()
 
         # Let the LED blink
-        while self._running:
-            sleep(0.05)
-            self.on()
-            sleep(0.05)
-            self.off()
+        self._running = True
+        self.show('tuning')
+
+    def show(self, pattern):
+        """Show a pattern of `patterns` or `on` / `off` on the LED"""
+        if pattern == 'on':
+            self._pwm.ChangeDutyCycle(0)
+        elif pattern == 'off':
+            self._pwm.ChangeDutyCycle(100)
+        else:
+            frequency, lit = self.patterns[pattern]
+            self._pwm.ChangeFrequency(frequency)
+            self._pwm.ChangeDutyCycle(100 - lit)
+        self.pattern = pattern
 
     def set_running(self):
-        sleep(0.02)
         self._running = True
 
     def is_running(self):
         return self._running
 
     def stop(self):
-        if self.noise is not None:
+        # settles may go from one channel straight to the next, nothing was started then
+        if self.noise is not None and self.noise.is_running():
             self.noise.stop()
-        if self.t1 is not None:
-            self.t1.join()
         self._running = False
+        self.off()
+
+    def close(self):
+        """Stop the PWM, the LED can not be used anymore"""
+        self._pwm.stop()
 
     def on(self):
-        GPIO.output(self.ledpin, False)
+        self.show('on')
 
     def off(self):
-        GPIO.output(self.ledpin, True)
+        self.show('off')
 
 
 class KY040:
@@ -596,15 +2716,19 @@ class KY040:
         current_channel_json: location of a `json` file containing the current channel and song
 
         absolute: Position of the Rotary switch (not exakt, just relative)
-        channels: list/array of positions where channels can be located
-        channel_dicts: array of channel dictionaries
+        dial: A DialMap object with the positions of the channels on the dial
+        channel_dicts: List with an entry per position of the dial, the channel dictionary
+          or `None` in a noise gap
 
         led: Blinker object
-        t1: threading.Thread object to handle the led
+        _buffering: `Timer` of the SCHEDULER letting the LED show an error if the audio of the radio
+          did not start within `BUFFER_TIMEOUT` seconds
 
         radio: A Player object that should run the current radio channel contained in
           `self.channel_dicts[self.absolute]['stream']`
         t2: threading.Thread object to handle the `start` method of the radio
+        players: A PlayerPool object providing the radio and standby players for the neighbours
+        player_backend: A PlayerBackend object playing radio and noise, `None` to use omxplayer
 
         volume: A VolumeControl object
         t_volumne: A threading.Thread object where the Volume controller can run in parallel
@@ -612,30 +2736,43 @@ class KY040:
         channel_writer: A ChannelWriter object to write current channel infos to disk
         t_writer: A threading.Thread object to handle the start of the channel_writer
 
+        scrobble_queue: A ScrobbleQueue object handed to every channel_writer
+        prefetcher: A NowPlayingPrefetcher object handed to every channel_writer
+
+        decoder: A QuadratureDecoder object turning the edges of the clock and data pin into steps
+        playing: Position of the channel played
+        t_dial: threading.Thread object running the `_dial_worker`
+        edges: Number of calls of the rotary switch callback
+        dropped_edges: Number of steps dropped as the queue was full
+        callback_time: Total seconds spent in the rotary switch callback
+        callback_time_max: Maximum seconds spent in one rotary switch callback
+
     """
     CLOCKWISE = 0
     ANTICLOCKWISE = 1
     DEBOUNCE = 200
+    # a detent within 25 ms after the last one moves 3 positions, within 50 ms 2 positions
+    ACCELERATION = ((0.025, 3), (0.05, 2))
+    DIAL_QUEUE_SIZE = 64
+    # steps from a channel at which its station fades out completely with a mixing player backend
+    FADE = 2
+    # seconds to wait for the audio of a channel before the LED shows an error
+    BUFFER_TIMEOUT = 15
+    SETTLE = 0.15
 
     def __init__(self, clockPin, dataPin, switchPin, ledpin, rotaryCallback, switchCallback, channeldict,
                  errorlog="/home/pi/share/radioflask/static/test/errorlog.txt",
                  lastfm_dict=None,
-                 current_channel_json=''
+                 current_channel_json='',
+                 scrobble_queue=None,
+                 prefetcher=None,
+                 player_pool=None,
+                 player_backend=None,
+                 dial=None
                  ):
 
-        # Start Error LOG by moving old log
-        nowtime = str(datetime.datetime.now().today().isoformat())
-        try:
-            os.rename(errorlog, errorlog.replace("errorlog",
-                                                 "old_errorlog" + nowtime[0:10] + "-" + nowtime[11:13] + nowtime[
-                                                                                                         14:16] + nowtime[
-                                                                                                                  17:19]))
-        except:
-            print("no new errorlog")
-        with open(errorlog, "w") as f:
-            f.write("start: ")
-            f.write(nowtime)
-            f.write("\n")
+        # Start Error LOG, it is rotated by size instead of on every start
+        open_log(errorlog).write("start", source='KY040', level='INFO')
 
         # persist values
         if lastfm_dict is None:
@@ -648,49 +2785,61 @@ class KY040:
         self.switchCallback = switchCallback
         self.errorlog = errorlog
         self.current_channel_json = current_channel_json
+        self.scrobble_queue = scrobble_queue
+        self.prefetcher = prefetcher
 
         # Read last played channel
-        with open(self.current_channel_json) as f:
-            current_id = json.load(f)
-
-        # Build up a like random list of channels
-        self.absolute = 4
-        self.channels = [4, 8, 12, 20, 25, 30, 35, 38]
-        self.channel_dicts = list(range(0, 38))
-        for channel_id in range(channeldict.__len__()):
-
-            if channel_id < self.channels.__len__():
-                # Add into the channel_dicts at the position "POS" the radio channel needed
-                pos = self.channels[channel_id]
-                self.channel_dicts[pos] = channeldict[channel_id]
-                if channeldict[channel_id]['id'] == current_id['id']:
-                    self.absolute = pos
-            else:
-                with open(errorlog, "a") as f:
-                    f.write('This channel could not be used:')
-                    f.write(channeldict[channel_id])
-        # Shorten the channels
-        self.channels = self.channels[:channeldict.__len__()]
+        current_id = open_state_file(self.current_channel_json, errorlog=self.errorlog).read()
+
+        # Lay out the channels on the dial, separated by noise gaps
+        if dial is None:
+            dial = DialMap(len(channeldict))
+        self.dial = dial
+        self.channel_dicts = self.dial.map(channeldict)
+        self.absolute = self.dial.positions[0]
+        for channel_id, channel in enumerate(channeldict):
+            if channel['id'] == current_id['id']:
+                self.absolute = self.dial.positions[channel_id]
+        EVENTS.publish('channel', {'position': self.absolute, 'id': self.channel_dicts[self.absolute]['id']})
+
+        # ------------------ Radio Player:
+        # The last played channel starts first, everything else is set up while it buffers
+        self.player_backend = player_backend
+        self.ledid = ledpin
+        if player_backend is not None:
+            noise = player_backend.noise_player(self.errorlog)
+        else:
+            noise = None
+        self.led = Blinker(ledpin=self.ledid, noise=noise)
+        self._buffering = None
+        self.playing = self.absolute
+        if player_pool is None:
+            player_pool = PlayerPool(errorlog=self.errorlog, backend=player_backend)
+        self.players = player_pool
+        self.radio = None
+        self.radio_on = True
+        self._tune(self.absolute)
+
+        #    Start an MP3 Player with the stream url of the current channel in a separate thread
+        self.t2 = threading.Thread(target=self._play, args=(self.absolute,))
+        self.t2.start()
 
         # ------------------ Pins
-        # setup pins for Rotary Switch and LED
+        # setup pins for Rotary Switch
         GPIO.setup(clockPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(dataPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(switchPin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        self.ledid = ledpin
-        self.led = Blinker(ledpin=self.ledid)
-
-        # ------------------ Radio Player:
-        self.t2 = None
-        #    Start an MP3 Player with the stream url of the current channel
-        self.radio = Player(self.channel_dicts[self.absolute]['stream'], self.errorlog)
-
-        # Start the radio in a separate thread
-        if not self.radio.is_running():
-            self.t2 = threading.Thread(target=self.radio.start)
-            self.t2.start()
-
-        self.radio_on = True
+        self.decoder = QuadratureDecoder(acceleration=self.ACCELERATION, trace=4096)
+
+        # ------------------ Rotary switch steps, handled by the _dial_worker
+        self._dial_steps = deque()
+        self._dial_condition = threading.Condition()
+        self._dial_running = False
+        self.t_dial = None
+        self.edges = 0
+        self.dropped_edges = 0
+        self.callback_time = 0
+        self.callback_time_max = 0
 
         # ------------------ Volume Controller
         # Define and start the VolumneControl in a separate thread
@@ -702,46 +2851,123 @@ class KY040:
         # ------------------ Channel / last.fm control
         # Define the channel writer
         self.channel_writer = ChannelWriter(self.channel_dicts[self.absolute], last_fm_doc=self.lastfm_dict,
-                                            logfile=self.errorlog, current_channel_json=self.current_channel_json)
+                                            logfile=self.errorlog, current_channel_json=self.current_channel_json,
+                                            scrobble_queue=self.scrobble_queue, prefetcher=self.prefetcher)
         self.channel_writer.set_running()
         # start it in a separate thread
         self.t_writer = threading.Thread(target=self.channel_writer.start)
         self.t_writer.start()
 
     def start(self):
+        # Start handling the steps of the Rotary switch
+        self._dial_running = True
+        self.t_dial = threading.Thread(target=self._dial_worker, name="dial")
+        self.t_dial.start()
+
         # Start detecting changes of the Rotary switch
-        GPIO.add_event_detect(self.clockPin, GPIO.FALLING, callback=self._clockCallback, bouncetime=self.DEBOUNCE)
+        # Both edges of both pins go through the quadrature decoder, it handles the bouncing
+        self.decoder.reset(GPIO.input(self.clockPin), GPIO.input(self.dataPin))
+        GPIO.add_event_detect(self.clockPin, GPIO.BOTH, callback=self._clockCallback)
+        GPIO.add_event_detect(self.dataPin, GPIO.BOTH, callback=self._clockCallback)
         GPIO.add_event_detect(self.switchPin, GPIO.FALLING, callback=self.switchCallback, bouncetime=self.DEBOUNCE)
 
     def stop(self):
         GPIO.remove_event_detect(self.clockPin)
+        GPIO.remove_event_detect(self.dataPin)
         GPIO.remove_event_detect(self.switchPin)
 
-        if hasattr(self, 't1'):
-            try:
-                self.led.stop()
-                self.t1.join()
-            except:
-                print("NO LED running")
+        with self._dial_condition:
+            self._dial_running = False
+            self._dial_condition.notify()
+        if self.t_dial is not None:
+            self.t_dial.join()
+
+        self.led.stop()
+        self.led.close()
+        if self._buffering is not None:
+            self._buffering.cancel()
 
         if self.t2 is not None and self.radio_on:
-            self.radio.stop()
             self.channel_writer.stop()
             self.t2.join()
             self.t_writer.join()
             self.radio_on = False
+        self.players.stop()
 
         self.volume.stop()
         self.t_volume.join()
 
     def _clockCallback(self, pin):
+        """ Register an edge of the rotary switch
+
+        Runs on the GPIO callback thread for edges of the clock and the data pin, so it only
+        decodes the edge and queues the positions moved. Everything else is done by
+        `_dial_worker`. If the queue is full, the step is dropped and counted in `dropped_edges`.
+        :return:
+        """
+        started = perf_counter()
+        step = self.decoder.edge(GPIO.input(self.clockPin), GPIO.input(self.dataPin), monotonic())
+        if step:
+            with self._dial_condition:
+                if len(self._dial_steps) < self.DIAL_QUEUE_SIZE:
+                    self._dial_steps.append(step)
+                    self._dial_condition.notify()
+                else:
+                    self.dropped_edges = self.dropped_edges + 1
+        elapsed = perf_counter() - started
+        self.edges = self.edges + 1
+        self.callback_time = self.callback_time + elapsed
+        self.callback_time_max = max(self.callback_time_max, elapsed)
+
+    def _dial_worker(self):
+        """Apply the queued steps of the rotary switch
+
+        All steps queued are applied to `self.absolute` at once. Only if no new step arrived
+        for `SETTLE` seconds, the settled position is handed to `_settle`, so a fast spin
+        does not start and stop a player for every position passed.
+        """
+        while True:
+            with self._dial_condition:
+                while not self._dial_steps and self._dial_running:
+                    self._dial_condition.wait()
+                if not self._dial_running:
+                    return
+                while self._dial_steps:
+                    while self._dial_steps:
+                        self.absolute = self.dial.step(self.absolute, self._dial_steps.popleft())
+                    self._tune(self.absolute)
+                    self._dial_condition.wait(self.SETTLE)
+                    if not self._dial_running:
+                        return
+                position = self.absolute
+            print("SWITCH:")
+            print(position)
+            self._settle(position)
+            self.rotaryCallback(position)
+
+    def _tune(self, position):
+        """Let a mixing player backend fade between noise and the nearest channel
+
+        Within `FADE` steps of a channel, its station gets louder and the noise quieter the closer
+        the dial is, before the position settled.
+        """
+        if not getattr(self.player_backend, 'mixes', False):
+            return
+        nearest = self.dial.nearest[position]
+        if nearest is None:
+            self.player_backend.tune(None, 0.0)
+            return
+        self.player_backend.tune(self.channel_dicts[nearest]['stream'],
+                                 max(0.0, 1 - self.dial.distance[position] / self.FADE))
+
+    def _settle(self, position):
         """ Most difficult function, defining the start/end of a radio channel
 
         This function basically controls all interactions with the radio except the
         volumne Controls like this:
 
-        Moving the rotary Switch:
-            Value is inside the channel array:
+        Settled position of the rotary Switch:
+            Value is a channel position of the dial:
                 Play the according radio channel
                 Start a channel_writer
                 Stop LED Blinker
@@ -750,71 +2976,104 @@ class KY040:
                 Stop the Radio Player
                 Stop the Channel Writer
                 Start LED Blinker
+        :param position: Settled position of the rotary switch
         :return:
         """
-        if GPIO.input(self.clockPin) == 0:
-            # Change self.absolute according to where the wheel was turned
-            # At the maximum, jump to zero
-            if GPIO.input(self.dataPin) == 0:
-                if self.absolute <= max(self.channels):
-                    self.absolute = self.absolute + 1
-                elif self.absolute == (max(self.channels) + 1):
-                    self.absolute = 0
-
-            # At the zero, jump to maximum
-            elif GPIO.input(self.dataPin) == 1:
-                if self.absolute > 0:
-                    self.absolute = self.absolute - 1
-                elif self.absolute == 0:
-                    self.absolute = max(self.channels)
-            print("SWITCH:")
-            print(self.absolute)
-
-            # NO CHANNEL : BLINK the LED, stop Radio
-            if self.absolute not in self.channels:
-
-                # Let the LED blink
-                if not self.led.is_running():
-                    self.led.set_running()
-                    if hasattr(self, 't1'):
-                        if not self.t1.is_alive():
-                            self.t1 = threading.Thread(target=self.led.start)
-                            self.t1.start()
-                    else:
-                        self.t1 = threading.Thread(target=self.led.start)
-                        self.t1.start()
-
-                # Stop the radio
-                if self.t2 is not None and self.radio_on:
-                    self.radio.stop()
-                    self.channel_writer.stop()
-                    self.t2.join()
-                    self.t_writer.join()
-                    self.radio_on = False
-
-            # Radio Channel found
-            else:
-                # Stop LED from blinking
-                self.led.stop()
-                if hasattr(self, 't1'):
-                    self.t1.join()
-                # set LED to ON
-                self.led.on()
-                # Start a Radio + a Channel Writer
-                if not self.radio.is_running():
-                    self.radio = Player(self.channel_dicts[self.absolute]['stream'], self.errorlog)
-                    self.t2 = threading.Thread(target=self.radio.start)
-                    self.t2.start()
-                    self.channel_writer = ChannelWriter(self.channel_dicts[self.absolute],
-                                                        last_fm_doc=self.lastfm_dict,
-                                                        logfile=self.errorlog,
-                                                        current_channel_json=self.current_channel_json)
-                    self.t_writer = threading.Thread(target=self.channel_writer.start)
-                    self.channel_writer.set_running()
-                    self.t_writer.start()
-                    self.radio_on = True
-
-            self.rotaryCallback(self.absolute)
+        channel = self.channel_dicts[position]
+        EVENTS.publish('channel', {'position': position, 'id': channel['id'] if channel is not None else None})
+
+        # NO CHANNEL : BLINK the LED, stop Radio
+        if self.channel_dicts[position] is None:
+
+            # Let the LED blink
+            if not self.led.is_running():
+                self.led.start()
+
+            # Stop the radio, it stays muted as a standby player
+            self._stop_radio()
+
+        # Radio Channel found
+        else:
+            # A different channel was reached directly by a fast spin
+            if self.radio_on and self.playing != position:
+                self._stop_radio()
+            # Stop LED from blinking, set LED to ON
+            self.led.stop()
+            self.led.on()
+            # Start a Radio + a Channel Writer
+            if not self.radio_on:
+                # set before the player thread starts, so the next settle compares with this channel
+                self.playing = position
+                self.t2 = threading.Thread(target=self._play, args=(position,))
+                self.t2.start()
+                self.channel_writer = ChannelWriter(self.channel_dicts[position],
+                                                    last_fm_doc=self.lastfm_dict,
+                                                    logfile=self.errorlog,
+                                                    current_channel_json=self.current_channel_json,
+                                                    scrobble_queue=self.scrobble_queue,
+                                                    prefetcher=self.prefetcher)
+                self.t_writer = threading.Thread(target=self.channel_writer.start)
+                self.channel_writer.set_running()
+                self.t_writer.start()
+                self.radio_on = True
+
+    def _stop_radio(self):
+        if self.t2 is not None and self.radio_on:
+            self.players.release()
+            self.channel_writer.stop()
+            self.t2.join()
+            self.t_writer.join()
+            self.radio_on = False
+
+    def dial_stats(self):
+        """Statistics of the rotary switch callback
+
+        :return: Dictionary with the number of `edges`, `dropped_edges`, `invalid_edges` and `detents`
+          and the mean and maximum time in microseconds spent in the GPIO callback
+        """
+        return {
+            'edges': self.edges,
+            'dropped_edges': self.dropped_edges,
+            'invalid_edges': self.decoder.invalid,
+            'detents': self.decoder.detents,
+            'callback_us_mean': self.callback_time / self.edges * 1e6 if self.edges else 0,
+            'callback_us_max': self.callback_time_max * 1e6
+        }
+
+    def _play(self, position):
+        """Play the channel at a position and prepare standby players for its neighbours
+
+        :param position: Position of the channel in `self.channel_dicts`
+        """
+        neighbours = []
+        for neighbour in self.dial.neighbours(position):
+            if self.channel_dicts[neighbour]['stream'] not in neighbours:
+                neighbours.append(self.channel_dicts[neighbour]['stream'])
+        self.radio = self.players.activate(self.channel_dicts[position]['stream'], neighbours)
+
+        # Let the LED show whether the audio started
+        if self._buffering is not None:
+            self._buffering.cancel()
+            self._buffering = None
+        if not self.radio.audio_started.is_set():
+            self.led.show('buffering')
+            radio = self.radio
+            self._buffering = SCHEDULER.call_later(self.BUFFER_TIMEOUT, self._buffering_failed, radio)
+            radio.audio_started.when_set(partial(self._buffered, radio))
+
+    def _buffered(self, radio):
+        """Called by the player as soon as its audio started"""
+        if radio is not self.radio or not self.radio_on or self.led.is_running():
+            # switched away, the LED shows something else
+            return
+        if self._buffering is not None:
+            self._buffering.cancel()
+        self.led.on()
+
+    def _buffering_failed(self, radio):
+        if radio is not self.radio or not self.radio_on or self.led.is_running() or radio.audio_started.is_set():
+            return
+        self.led.show('error')
 
     def _switchCallback(self, pin):
         """
@@ -833,6 +3092,10 @@ class KyoRadio:
         SWITCHPIN: GPIO Number of the switch pin of the Rotary switch
         LEDPIN: GPIO Number where an LED is put to let the radio blink on channel changes
         ky040: Upon start will be filled with a KY040 class object
+        scrobble_queue: Upon start will be filled with a ScrobbleQueue stored next to the `lastfm_json`
+        lastfm_session: Upon start will be filled with a LastFMSession stored next to the `lastfm_json`
+        prefetcher: Upon start will be filled with a NowPlayingPrefetcher polling all channels
+        player_backend: Upon start will be filled with the PlayerBackend, kept for the lifetime of the radio
 
     """
 
@@ -844,6 +3107,11 @@ class KyoRadio:
         self.SWITCHPIN = 13
         self.LEDPIN = 17
         self.ky040 = None
+        self.scrobble_queue = None
+        self.lastfm_session = None
+        self.prefetcher = None
+        self.player_backend = None
+        self._first_audio = False
 
         GPIO.setmode(GPIO.BCM)
         self._running = False
@@ -852,7 +3120,11 @@ class KyoRadio:
               channeldict='/home/share/radioflask/static/tests/channellist.json',
               errorlog="/home/pi/share/radioflask/static/tests/errorlog.txt",
               lastfm_json="/home/pi/share/radioflask/static/tests/lastfm.json",
-              current_channel_json="/home/pi/share/radioflask/static/tests/current.json"
+              current_channel_json="/home/pi/share/radioflask/static/tests/current.json",
+              player='omxplayer',
+              dial_gaps=None,
+              dial_resolution=None,
+              channels=None
               ):
         """
 
@@ -860,6 +3132,14 @@ class KyoRadio:
         :param errorlog: location of a txt file to store the error log in
         :param lastfm_json: location of the last.fm connection API / API_SECRET / PASSWORD(MD5) / USER
         :param current_channel_json: Location where the currently playing channel should be written
+        :param player: Player backend, `omxplayer` (one process per channel), `mpv` (one process controlled
+          over IPC), `mix` (noise and stations mixed in process) or `fake` (no audio)
+        :param dial_gaps: Number of noise positions before each channel on the dial, a number or a list
+          repeated for all channels. `None` keeps the former layout
+        :param dial_resolution: Number of positions of the dial to spread the channels evenly over,
+          used instead of `dial_gaps`
+        :param channels: Channel store shared with the web app (`views.ChannelStore`), its channels are
+          played instead of reading `channeldict`
         """
         def rotaryChange(direction):
             print("turned - " + str(direction))
@@ -867,26 +3147,93 @@ class KyoRadio:
         def switchPressed(pin):
             print("button connected to pin:{} pressed".format(pin))
 
-        with open(channeldict) as f:
-            channeldict = json.load(f)
+        if channels is not None:
+            channeldict = channels.to_dicts()
+        else:
+            with open(channeldict) as f:
+                channeldict = json.load(f)
+
+        try:
+            with open(lastfm_json) as f:
+                lastfm_dict = json.load(f)
+        except FileNotFoundError:
+            # last.fm was not set up yet, nothing is scrobbled
+            lastfm_dict = {}
 
-        with open(lastfm_json) as f:
-            lastfm_dict = json.load(f)
+        # The last.fm session key and songs not yet scrobbled are kept on disk next to the last.fm settings
+        if self.lastfm_session is None or self.lastfm_session.doc != lastfm_dict:
+            self.lastfm_session = LastFMSession(lastfm_dict,
+                                                os.path.join(os.path.dirname(lastfm_json), 'lastfm_session.json'))
+        if self.scrobble_queue is None:
+            self.scrobble_queue = ScrobbleQueue(os.path.join(os.path.dirname(lastfm_json), 'scrobbles.db'),
+                                                errorlog=errorlog)
+        self.scrobble_queue.session = self.lastfm_session if lastfm_dict else None
+
+        # The player backend is started once and kept over restarts, simulated hardware plays no audio
+        if hal.is_simulated() and hal.fallback_error is not None:
+            open_log(errorlog).write(hal.fallback_error, source='KyoRadio')
+        if hal.is_simulated() and player == 'omxplayer':
+            player = 'fake'
+        if self.player_backend is None:
+            self.player_backend = open_player_backend(player, errorlog=errorlog)
+
+        # The songs of all channels are polled in the background once the radio plays
+        self.prefetcher = NowPlayingPrefetcher(channeldict, errorlog=errorlog)
+
+        # Lay out the channels on the dial
+        if dial_resolution is not None:
+            dial = DialMap.spread(len(channeldict), dial_resolution)
+        elif dial_gaps is not None:
+            dial = DialMap(len(channeldict), dial_gaps)
+        else:
+            dial = DialMap(len(channeldict))
 
         # Start a KYO40 Rotary Switch controlled radio
         self.ky040 = KY040(self.CLOCKPIN, self.DATAPIN, self.SWITCHPIN, self.LEDPIN, rotaryChange, switchPressed,
-                           channeldict, errorlog, lastfm_dict, current_channel_json=current_channel_json
+                           channeldict, errorlog, lastfm_dict, current_channel_json=current_channel_json,
+                           scrobble_queue=self.scrobble_queue, prefetcher=self.prefetcher,
+                           player_backend=self.player_backend, dial=dial
                            )
         self.t1 = threading.Thread(target=self.ky040.start)
         print('Launch switch monitor class.')
         self.t1.start()
+        self.prefetcher.start()
         self._running = True
+        startup.mark('radio started')
+        if not self._first_audio:
+            SCHEDULER.call_later(0, self._watch_first_audio, self.ky040, blocking=True)
+
+    def _watch_first_audio(self, ky040):
+        """Let the player of the first channel mark the start of its audio"""
+        # the player is started by a thread of the KY040
+        ky040.t2.join()
+        radio = ky040.radio
+        if radio is not None:
+            radio.audio_started.when_set(partial(self._mark_first_audio, radio))
+
+    def _mark_first_audio(self, radio):
+        if not self._first_audio:
+            self._first_audio = True
+            startup.mark('first audio', radio.audio_started_at)
 
     def stop(self):
         self.ky040.stop()
         self.t1.join()
+        self.prefetcher.stop()
+        # the current channel and log records may still wait to be written
+        flush_state_files()
+        flush_logs()
         self._running = False
 
+    def now_playing(self):
+        """Songs currently playing on all channels
+
+        :return: List of dictionaries containing `id`, `name`, `song`
+        """
+        if self.prefetcher is None:
+            return []
+        return self.prefetcher.snapshot()
+
 
 # test the radio for 10 seconds
 if __name__ == "__main__":
@@ -894,4 +3241,5 @@ if __name__ == "__main__":
     x.start()
     sleep(10)
     x.stop()
+    SCHEDULER.stop()
     exit()
@@ -0,0 +1,221 @@
+"""
+Error log of the radio
+
+All components write to one `ErrorLog` per file, taken from `open_log`:
+
+    open_log(self.errorlog).write('Player Start Error: ' + mp3, source='Player')
+
+`write` only appends the record to memory, so it can be called from the GPIO
+callbacks or the audio threads. A background thread writes the records to disk in
+batches, once a second at most. The last records are kept in a ring buffer, so the
+web app shows them without reading the file. When the file grows over `max_bytes` it
+is rotated to `errorlog.txt.1`, `errorlog.txt.2`, ... keeping `backups` old files.
+
+`ErrorLog.tail` reads the file from a byte offset, so a client only fetches the lines
+written since its last request. The file id (its inode and the number of rotations)
+tells the client when the file was rotated.
+"""
+import atexit
+import datetime
+import os
+import threading
+from collections import deque, namedtuple
+
+Record = namedtuple('Record', ['seq', 'time', 'level', 'source', 'message'])
+
+
+class ErrorLog:
+    """Log file written in batches by a background thread
+
+    Attributes:
+        path: Location of the log file
+        max_bytes: Size of the file in bytes after which it is rotated
+        backups: Number of rotated files kept
+        flush_interval: Seconds records are collected before they are written
+        records: `collections.deque` of the last `Record` objects
+        seq: Sequence number of the last record, counted from 1
+        dropped: Number of records that could not be written
+        rotations: Number of times the file was rotated by this object
+    """
+
+    def __init__(self, path, capacity=500, max_bytes=1024 * 1024, backups=3, flush_interval=1.0):
+        """
+        :param path: Location of the log file
+        :param capacity: Number of records kept in `records`
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._pending = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def write(self, message, source='', level='ERROR'):
+        """Add a record, it is written to the file by the background thread
+
+        :param message: Text of the record, may contain several lines
+        :param source: Name of the component writing the record
+        :param level: `ERROR`, `WARNING` or `INFO`
+        :return: The Record
+        """
+        with self._condition:
+            self.seq = self.seq + 1
+            record = Record(self.seq, datetime.datetime.now(), level, source, message.rstrip("\n"))
+            self.records.append(record)
+            self._pending.append(record)
+            if self._thread is None:
+                self._closed = False
+                self._thread = threading.Thread(target=self._run, name="errorlog", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return record
+
+    def since(self, seq=0, limit=None):
+        """Records kept in memory with a sequence number above `seq`
+
+        :param limit: Maximum number of records, the newest are returned
+        :return: List of Record objects, oldest first
+        """
+        with self._condition:
+            records = [record for record in self.records if record.seq > seq]
+        if limit is not None:
+            records = records[-limit:]
+        return records
+
+    def tail(self, offset=None, limit=64 * 1024, file_id=None):
+        """Complete lines of the log file after a byte offset
+
+        :param offset: Byte offset returned by the previous call, `None` for the last lines
+          of the file. A negative offset is read as 0.
+        :param limit: Maximum number of bytes read
+        :param file_id: File id returned by the previous call. If the file was rotated since, it
+          differs and the new file is read from the start. Without it, only an offset behind the end
+          of the file shows a rotation. The inode alone is not enough, the new file may get the
+          inode of the oldest backup it replaced.
+        :return: Tuple of the text, the offset to continue at and the file id
+        """
+        last_lines = offset is None
+        try:
+            with open(self.path, 'rb') as f:
+                current_id = '{}.{}'.format(os.fstat(f.fileno()).st_ino, self.rotations)
+                size = f.seek(0, os.SEEK_END)
+                if last_lines:
+                    offset = max(0, size - limit)
+                elif offset < 0 or offset > size or (file_id is not None and file_id != current_id):
+                    offset = 0
+                f.seek(offset)
+                chunk = f.read(limit)
+        except FileNotFoundError:
+            return '', 0, None
+        if last_lines and offset > 0:
+            # start at the first complete line
+            start = chunk.find(b'\n') + 1 or len(chunk)
+            chunk = chunk[start:]
+            offset = offset + start
+        # end at the last complete line, the writer may be in the middle of one
+        end = chunk.rfind(b'\n') + 1
+        if end == 0 and len(chunk) == limit:
+            # a single line longer than the limit
+            end = len(chunk)
+        return chunk[:end].decode('utf-8', errors='replace'), offset + end, current_id
+
+    def flush(self):
+        """Write the pending records now"""
+        self._write_pending()
+
+    def close(self):
+        """Write the pending records and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._closed:
+                    # collect everything written in the meantime into one batch
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            self._write_pending()
+            if closed:
+                return
+
+    def _write_pending(self):
+        # the records are taken while holding the write lock, so batches are written in order
+        with self._write_lock:
+            with self._condition:
+                pending, self._pending = self._pending, []
+            self._write(pending)
+
+    def _write(self, records):
+        if not records:
+            return
+        text = ''.join(format_record(record) for record in records)
+        try:
+            self._rotate(len(text))
+            with open(self.path, 'a') as f:
+                f.write(text)
+        except OSError as e:
+            self.dropped = self.dropped + len(records)
+            print("Writing the error log failed: " + str(e))
+
+    def _rotate(self, adding):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0 or size + adding <= self.max_bytes:
+            return
+        for number in range(self.backups - 1, 0, -1):
+            older = self.path + '.' + str(number)
+            if os.path.exists(older):
+                os.replace(older, self.path + '.' + str(number + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.rotations = self.rotations + 1
+
+
+def format_record(record):
+    """:return: The record as lines of the log file"""
+    source = record.source + ': ' if record.source else ''
+    return '{} {} {}{}\n'.format(record.time.isoformat(sep=' ', timespec='seconds'), record.level, source,
+                                 record.message)
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def open_log(path):
+    """:return: The ErrorLog of `path`, the same object for every call"""
+    path = os.path.abspath(path)
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = ErrorLog(path)
+        return _logs[path]
+
+
+def flush_logs():
+    """Write the pending records of all ErrorLogs now"""
+    with _logs_lock:
+        logs = list(_logs.values())
+    for log in logs:
+        log.flush()
+
+
+atexit.register(flush_logs)
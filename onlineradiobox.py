@@ -0,0 +1,95 @@
+"""
+Now playing parser for OnlineRadioBox playlist pages
+
+An OnlineRadioBox playlist page lists the last songs of a station inside
+`<table class="tablelist-schedule">`. The newest song is the second cell of the
+first row of its `<tbody>`, written as `Artist - Title` (or `Title von Artist`).
+
+Instead of building the whole page as a tree, the page is fed chunk by chunk into
+an `lxml.etree.HTMLPullParser`. Everything outside the schedule table is dropped as
+soon as it was parsed and parsing stops with the first schedule row.
+"""
+from collections import namedtuple
+from lxml import etree
+
+SCHEDULE_CLASS = "tablelist-schedule"
+
+# all non-whitespace text nodes of a table cell
+CELL_TEXT = etree.XPath(".//text()[normalize-space()]")
+
+NowPlaying = namedtuple("NowPlaying", ["artist", "title", "timestamp"])
+
+
+def split_song(text, stationname="none"):
+    """Split the song text of a schedule row into artist and title
+
+    :param text: `Artist - Title`, `Title von Artist` or just a title
+    :param stationname: Artist used if the text does not contain one
+    :return: Tuple of `(artist, title)`
+    """
+    text = text.strip()
+    parts = text.split(" - ", 1)
+    if len(parts) == 2:
+        return parts[0], parts[1]
+    parts = text.split(" von ", 1)
+    if len(parts) == 2:
+        return parts[1], parts[0]
+    return stationname, text
+
+
+def find_song_text(chunks):
+    """Find the text of the newest song in an OnlineRadioBox page
+
+    :param chunks: Iterable of `bytes` chunks of the page, e.g. `response.iter_content()`.
+      It is only consumed up to the first schedule row.
+    :return: The text of the first schedule row or `None` if the page has no schedule
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    table = None
+    tbody = None
+    row = None
+    column = 0
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                if table is None:
+                    if elem.tag == "table" and elem.get("class") == SCHEDULE_CLASS:
+                        table = elem
+                elif tbody is None:
+                    if elem.tag == "tbody":
+                        tbody = elem
+                elif row is None:
+                    if elem.tag == "tr":
+                        row = elem
+                elif elem.tag == "td" and elem.getparent() is row:
+                    column = column + 1
+            elif table is None:
+                # Nothing of interest, free the memory of this element
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+            elif row is not None and elem.tag == "td" and elem.getparent() is row and column == 2:
+                text = CELL_TEXT(elem)
+                return text[0] if text else ""
+            elif elem is row or elem is table:
+                return None
+    return None
+
+
+def parse_now_playing(chunks, stationname="none", timestamp=None):
+    """Parse the currently playing song from an OnlineRadioBox playlist page
+
+    :param chunks: Iterable of `bytes` chunks of the page or the whole page as `bytes`
+    :param stationname: Artist used if the song has none
+    :param timestamp: Timestamp stored in the record
+    :return: `NowPlaying` record or `None` if the page has no schedule
+    """
+    if isinstance(chunks, (bytes, str)):
+        chunks = [chunks]
+    text = find_song_text(chunks)
+    if text is None:
+        return None
+    artist, title = split_song(text, stationname)
+    return NowPlaying(artist=artist, title=title, timestamp=timestamp)
@@ -0,0 +1,121 @@
+"""
+Quadrature decoder for the KY-040 rotary switch
+
+The switch has two contacts, CLK and DT. Turning it by one detent runs both
+through a full Gray-code cycle, starting and ending in the rest state where both
+pins read 1:
+
+    clockwise:      11 -> 10 -> 00 -> 01 -> 11
+    anticlockwise:  11 -> 01 -> 00 -> 10 -> 11
+
+(written as `CLK DT`). Every edge on either pin is fed to `QuadratureDecoder.edge`
+which looks up the transition in a 16 entry table. Contact bounce only moves back
+and forth between two neighbouring states and cancels itself, a transition where
+both pins changed at once (a lost edge) is rejected. A detent is counted when the
+switch is back in the rest state.
+"""
+from collections import deque
+
+REST = 3
+INVALID = None
+
+# TRANSITIONS[old_state << 2 | new_state] with state = CLK << 1 | DT
+TRANSITIONS = (
+    0, 1, -1, INVALID,      # from 00
+    -1, 0, INVALID, 1,      # from 01
+    1, INVALID, 0, -1,      # from 10
+    INVALID, -1, 1, 0,      # from 11
+)
+
+# quarter steps needed when back in the rest state to count a detent,
+# so a single lost edge inside a detent does not lose the detent
+MIN_QUARTERS = 2
+
+
+class QuadratureDecoder:
+    """Decode the edges of a rotary switch into detents
+
+    Attributes:
+        acceleration: Tuple of `(seconds, positions)` pairs, sorted by `seconds`. A detent
+          following the previous one into the same direction within `seconds` counts as
+          `positions` detents.
+        state: Last state `CLK << 1 | DT`
+        quarters: Quarter steps since the last rest state
+        last_edge: Timestamp of the last edge
+        last_detent: Timestamp of the last detent
+        last_direction: Direction of the last detent, 1 or -1
+        edges: Number of edges decoded
+        invalid: Number of rejected transitions
+        detents: Number of detents decoded, without acceleration
+        trace: `collections.deque` of the last `(timestamp, clk, dt)` edges or `None`
+    """
+
+    def __init__(self, acceleration=(), trace=0):
+        """
+        :param acceleration: See `acceleration` attribute, `()` to switch it off
+        :param trace: Number of edges to keep in `trace`, 0 to keep none
+        """
+        self.acceleration = tuple(acceleration)
+        self.state = REST
+        self.quarters = 0
+        self.last_edge = None
+        self.last_detent = None
+        self.last_direction = 0
+        self.edges = 0
+        self.invalid = 0
+        self.detents = 0
+        self.trace = deque(maxlen=trace) if trace else None
+
+    def edge(self, clk, dt, timestamp):
+        """Decode one edge
+
+        :param clk: Level of the CLK pin after the edge
+        :param dt: Level of the DT pin after the edge
+        :param timestamp: Time of the edge in seconds
+        :return: Positions moved, positive clockwise, negative anticlockwise, 0 if no detent was completed
+        """
+        new_state = (clk << 1) | dt
+        self.edges = self.edges + 1
+        self.last_edge = timestamp
+        if self.trace is not None:
+            self.trace.append((timestamp, clk, dt))
+
+        move = TRANSITIONS[(self.state << 2) | new_state]
+        self.state = new_state
+        if move is INVALID:
+            self.invalid = self.invalid + 1
+            return 0
+        self.quarters = self.quarters + move
+        if new_state != REST:
+            return 0
+
+        quarters = self.quarters
+        self.quarters = 0
+        if abs(quarters) < MIN_QUARTERS:
+            return 0
+        self.detents = self.detents + 1
+        direction = 1 if quarters > 0 else -1
+        positions = 1
+        if self.last_detent is not None and direction == self.last_direction:
+            interval = timestamp - self.last_detent
+            for seconds, accelerated in self.acceleration:
+                if interval < seconds:
+                    positions = accelerated
+                    break
+        self.last_detent = timestamp
+        self.last_direction = direction
+        return positions * direction
+
+    def reset(self, clk=1, dt=1):
+        """Forget a partial detent and continue from the given pin levels"""
+        self.state = (clk << 1) | dt
+        self.quarters = 0
+
+    def write_trace(self, path):
+        """Write the edges kept in `trace` as CSV with one `timestamp,clk,dt` edge per line
+
+        The file can be replayed with `benchmarks/quadrature_replay.py --trace`.
+        """
+        with open(path, "w") as f:
+            for timestamp, clk, dt in self.trace or ():
+                f.write("{:.6f},{},{}\n".format(timestamp, clk, dt))
@@ -0,0 +1,92 @@
+"""
+Startup timeline and lazy imports
+
+`mark` records how long after the start of the process something happened, `report`
+prints the timeline, e.g.:
+
+    startup timeline:
+        +0.412 s  views imported
+        +0.650 s  radio started
+        +0.655 s  import requests (0.180 s)
+        +1.020 s  first audio
+        +1.100 s  web UI ready
+
+`lazy_import` returns a stand-in for a module that imports it on the first attribute
+access, so heavy modules (numpy, lxml, pylast, requests) are loaded when needed and
+not before the first channel plays. Their import times are part of the timeline.
+"""
+import importlib
+import threading
+from time import monotonic, perf_counter
+
+STARTED = monotonic()
+
+timeline = []
+_expected = set()
+_reported_after = set()
+_lock = threading.Lock()
+
+
+def mark(event, started=None):
+    """Record an event of the startup
+
+    :param event: Description of the event
+    :param started: `time.monotonic()` value when it happened, defaults to now
+    """
+    if started is None:
+        started = monotonic()
+    with _lock:
+        timeline.append((started - STARTED, event))
+        _expected.discard(event)
+        complete = not _expected and event in _reported_after
+    if complete:
+        print(report())
+
+
+def expect(*events):
+    """Print the report as soon as all `events` were marked"""
+    with _lock:
+        marked = set(event for _, event in timeline)
+        _expected.update(set(events) - marked)
+        _reported_after.update(events)
+
+
+def report():
+    """:return: The timeline as text, ordered by time"""
+    with _lock:
+        events = sorted(timeline)
+    lines = ['startup timeline:']
+    for seconds, event in events:
+        lines.append('    +{:.3f} s  {}'.format(seconds, event))
+    return '\n'.join(lines)
+
+
+class LazyModule:
+    """Stand-in of a module, imported at the first attribute access
+
+    Attributes:
+        _name: Name of the module
+        _module: The module once imported, else `None`
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            started = perf_counter()
+            module = importlib.import_module(self._name)
+            if self._module is None:
+                mark('import {} ({:.3f} s)'.format(self._name, perf_counter() - started))
+                self._module = module
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return '<lazy module {!r}{}>'.format(self._name, '' if self._module is None else ' (imported)')
+
+
+def lazy_import(name):
+    """:return: A LazyModule of the module `name`"""
+    return LazyModule(name)
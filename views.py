@@ -8,7 +8,8 @@ description: This is the view file generating the substantial
 
 Views:
     1. **Currently Playing**: shows the song currently playing and
-    a refresh button to check if a new song is playing
+    a refresh button to check if a new song is playing. Below, the songs
+    currently playing on all other channels are listed
 
     2. **Radio Channels**: shows an input field to add a radio
     channel. Additionally, for each channel already inside the
@@ -39,17 +40,25 @@ __status__ = "Production"
 
 
 from datetime import datetime
-from flask import Flask, render_template, request, session
+from flask import Flask, render_template, request, session, jsonify, Response
 from flask_fontawesome import FontAwesome
-import numpy as np
 import os
 import json
+import hashlib
+import time
+import threading
+from collections import OrderedDict
 from flask_wtf import FlaskForm, CsrfProtect
-from wtforms import StringField, validators, PasswordField
-from pylast import md5
+from wtforms import StringField, validators, PasswordField, SelectField
 import re
 from werkzeug.datastructures import MultiDict
-from ky40 import KyoRadio
+from ky40 import KyoRadio, open_state_file, EVENTS
+from logbook import open_log, format_record
+import hal
+from startup import lazy_import
+
+# imported at the first use, so the radio plays before it is loaded
+pylast = lazy_import('pylast')
 
 
 class Channel(FlaskForm):
@@ -62,6 +71,8 @@ class Channel(FlaskForm):
         channel_name: String Input for the name of the channel
         stream_url: String Input for the mp3 URL
         online_radio_box: String Input for the Onlineradiobox link
+        song_source: Select where the song playing is read from, the Onlineradiobox link or
+            the ICY metadata of the stream
 
     """
     channel_name = StringField("Channel Name", validators=[validators.InputRequired(message="Cannot be empty")])
@@ -69,8 +80,12 @@ class Channel(FlaskForm):
                              validators=[validators.regexp("^http[s]{0,1}\\:.*", message="Please enter a valid URL")])
     online_radio_box = StringField("Url for Online Radio Box",
                                    validators=[
+                                       validators.Optional(),
                                        validators.regexp("^http[s]{0,1}\\:.*", message="Please enter a valid URL")]
                                    )
+    song_source = SelectField("Song info from",
+                              choices=[("onlineradiobox", "Online Radio Box"), ("icy", "Stream metadata (ICY)")],
+                              default="onlineradiobox")
 
 
 class LastFMForm(FlaskForm):
@@ -92,149 +107,278 @@ class RemoveChannel(object):
         stream_url: The mp3 url of the song
         online_radio_box: The onlineradio box link
         id: The `channel_id` of this channel
+        source: Where the song playing is read from, `onlineradiobox` or `icy`
 
     Methods:
         to_dict: return as a dictionary to write it to json
     """
-    def __init__(self, channel_name, stream_url, channel_online_radio_box, id=1):
+    def __init__(self, channel_name, stream_url, channel_online_radio_box, id=1, source='onlineradiobox'):
         """
 
         :param channel_name:
         :param stream_url:
         :param channel_online_radio_box:
         :param id:
+        :param source:
         """
         self.channel_name = channel_name
         self.stream_url = stream_url
         self.online_radio_box = channel_online_radio_box
         self.id = id
+        self.source = source
 
     def to_dict(self):
         return ({
             'name': self.channel_name,
             'stream': self.stream_url,
             'onlineradiobox': self.online_radio_box,
-            'id': self.id
+            'id': self.id,
+            'source': self.source
         })
 
 
-class ChannelList(object):
-    """List of all channels in the radio
+class ChannelStore(object):
+    """Channels of the radio, ordered and indexed by their id
+
+    Kept in memory for the lifetime of the app and shared with the radio and all browsers.
+    Channels added or removed in the web UI are kept per session in `ChannelEdits` and
+    handed to this store by `apply` when they are saved.
+
+    Ids are `channel_id<N>` with `N` from a counter that only goes up and is stored next to
+    the json file, so the id of a removed channel is never given to a new one.
 
     Attributes:
         json_file: Location of the json file to represent this class
-        list: List of RemoveChannel objects
-        read_json: whether the json file was already read
+        counter_file: Location of the json file storing the id counter
+        next_id: Number of the next channel id
+        version: Number increased on every change
+        dirty: Whether there are changes not saved
 
     """
-    def __init__(self, list_of_remove_channel=None, json_file='', was_post=False):
+    def __init__(self, json_file):
         """constructor
 
-        :param list_of_remove_channel: A dictionary of the channel that should be removed
-        :param json_file: Location where this class is stored / read
-        :param was_post: Whether this class was constructed by a POST request
+        :param json_file: Location where the channels are stored / read
         """
-        if list_of_remove_channel is None:
-            list_of_remove_channel = list()
         self.json_file = json_file
-        for channel in list_of_remove_channel:
-            if not isinstance(channel, RemoveChannel):
-                TypeError()
-        self.list = list_of_remove_channel
-        if list_of_remove_channel.__len__() > 0 or was_post:
-            self.read_json = True
-        else:
-            self.read_json = False
+        self.counter_file = os.path.join(os.path.dirname(json_file), 'channel_counter.json')
+        self._channels = OrderedDict()
+        self._lock = threading.RLock()
+        self.next_id = 1
+        self.version = 0
+        self.dirty = False
+        self.from_json()
+
+    @property
+    def list(self):
+        """List of RemoveChannel objects, in the order of the dial"""
+        with self._lock:
+            return list(self._channels.values())
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __iter__(self):
+        return iter(self.list)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._channels
+
+    def get(self, channel_id):
+        """:return: The RemoveChannel with `channel_id` or `None`"""
+        return self._channels.get(channel_id)
 
     def append(self, remove_channel):
-        """Add a channel to the list
+        """Add a channel at the end of the list, it gets the next id
 
-        :param remove_channel: Dictionary of the RemoveChannel to be added
+        :param remove_channel: RemoveChannel to be added
         """
-        if isinstance(remove_channel, RemoveChannel):
-            all_ids = np.asarray([val.id for i, val in enumerate(self.list)])
-            if (len(all_ids) > 0):
-                remove_channel.id = 'channel_id' + str(max(
-                    [int(re.search("\d+", val.id).group()) for i, val in enumerate(self.list)]
-                ) + 1)
-            else:
-                remove_channel.id = 'channel_id' + str(len(self.list) + 1)
-            self.list.append(remove_channel)
-        else:
-            print("Not of type RemoveChannel")
+        if not isinstance(remove_channel, RemoveChannel):
+            raise TypeError("Not of type RemoveChannel")
+        with self._lock:
+            remove_channel.id = 'channel_id' + str(self.next_id)
+            self.next_id = self.next_id + 1
+            self._channels[remove_channel.id] = remove_channel
+            self._changed()
+
+    def remove(self, channel_id):
+        """Remove a channel
+
+        :param channel_id: Unique Identifier of a channel
+        :return: Nothing, just remove Channel
+        """
+        with self._lock:
+            if self._channels.pop(channel_id, None) is not None:
+                self._changed()
+
+    def _changed(self):
+        self.version = self.version + 1
+        self.dirty = True
 
     def from_json(self):
-        """Add channels to this class from a JSON file
+        """Replace the channels of this store by the channels of the json file
 
+        Channels stored without an id get the next id.
         """
         print("Reading Channellist from hard drive")
         with open(self.json_file, 'r') as f:
-            for channel_entry in json.load(f):
-                self.append(RemoveChannel(channel_entry["name"],
-                                          channel_entry["stream"],
-                                          channel_entry["onlineradiobox"]))
-        self.read_json = True
+            channel_entries = json.load(f)
+        try:
+            with open(self.counter_file) as f:
+                next_id = json.load(f)['next_id']
+        except (FileNotFoundError, ValueError, KeyError):
+            next_id = 1
+        channels = OrderedDict()
+        for channel_entry in channel_entries:
+            channel = RemoveChannel(channel_entry["name"],
+                                    channel_entry["stream"],
+                                    channel_entry["onlineradiobox"],
+                                    channel_entry.get("id"),
+                                    source=channel_entry.get("source", "onlineradiobox"))
+            number = re.fullmatch(r"channel_id(\d+)", channel.id or "")
+            if number is None or channel.id in channels:
+                channel.id = 'channel_id' + str(next_id)
+                next_id = next_id + 1
+            else:
+                next_id = max(next_id, int(number.group(1)) + 1)
+            channels[channel.id] = channel
+        with self._lock:
+            self._channels = channels
+            self.next_id = next_id
+            self.version = self.version + 1
+            self.dirty = False
 
     def to_json(self):
         """Write this class to json file
 
-        :return: Nothing, will be written to self.json_file
+        :return: Nothing, will be written to self.json_file and self.counter_file
         """
-        with open(self.json_file, 'w') as f:
-            json.dump([val.to_dict() for i, val in enumerate(self.list)], f)
+        with self._lock:
+            with open(self.json_file, 'w') as f:
+                json.dump(self.to_dicts(), f)
+            with open(self.counter_file, 'w') as f:
+                json.dump({'next_id': self.next_id}, f)
+            self.dirty = False
+
+    def save(self):
+        """Write the channels to disk if anything changed"""
+        with self._lock:
+            if self.dirty:
+                self.to_json()
+
+    def apply(self, added=(), removed=()):
+        """Remove and add channels at once and write them to disk
+
+        :param added: RemoveChannel objects to be added, they get the next ids
+        :param removed: Ids of the channels to be removed
+        """
+        with self._lock:
+            for channel_id in removed:
+                self.remove(channel_id)
+            for remove_channel in added:
+                self.append(remove_channel)
+            self.save()
 
-    def as_json(self):
-        """Reconstruct this class as a JSON dictionary
+    def to_dicts(self):
+        """:return: List of the channel dictionaries, as stored in the json file"""
+        with self._lock:
+            return [val.to_dict() for val in self._channels.values()]
+
+
+class ChannelEdits(object):
+    """Channels added or removed in one browser session but not saved yet
+
+    The edits are kept in the flask session, so browsers editing at the same time do not
+    see or drop each other's changes. `list` shows the channels of the shared ChannelStore
+    with these edits, `apply` hands them to the store.
+
+    Attributes:
+        store: The ChannelStore shared by all sessions
+        added: List of channel dictionaries added, their ids are `new<N>` until saved
+        removed: List of ids of stored channels removed
+        next_id: Number of the next `new<N>` id
+
+    Methods:
+        as_json: Store this object inside the flask session
+    """
+    def __init__(self, store, edits=None):
+        """
 
-        :return: A dictionary containing most of the attributes of this class
+        :param store: The ChannelStore shared by all sessions
+        :param edits: Dictionary from `as_json` or `None` if there are no edits
         """
-        return ({
-            'list': [val.to_dict() for i, val in enumerate(self.list)],
-            'read_json': self.read_json,
-            'json_file': self.json_file
-        })
+        if edits is None:
+            edits = {}
+        self.store = store
+        self.added = list(edits.get('added', []))
+        self.removed = list(edits.get('removed', []))
+        self.next_id = edits.get('next_id', 1)
+
+    @property
+    def list(self):
+        """List of RemoveChannel objects, the stored ones first"""
+        return [channel for channel in self.store if channel.id not in self.removed] + \
+            [self._channel(channel_entry) for channel_entry in self.added]
+
+    @staticmethod
+    def _channel(channel_entry):
+        return RemoveChannel(channel_entry["name"],
+                             channel_entry["stream"],
+                             channel_entry["onlineradiobox"],
+                             channel_entry["id"],
+                             source=channel_entry["source"])
+
+    def append(self, remove_channel):
+        """Add a channel, it gets a `new<N>` id until it is saved
+
+        :param remove_channel: RemoveChannel to be added
+        """
+        if not isinstance(remove_channel, RemoveChannel):
+            raise TypeError("Not of type RemoveChannel")
+        remove_channel.id = 'new' + str(self.next_id)
+        self.next_id = self.next_id + 1
+        self.added.append(remove_channel.to_dict())
 
     def remove(self, channel_id):
-        """Remove a channel from this self.list
+        """Remove a channel added in this session or a stored one
 
         :param channel_id: Unique Identifier of a channel
-        :return: Nothing, just remove Channel
         """
-        indexes = np.asarray([i if val.id == channel_id else -1 for i, val in enumerate(self.list)])
-        indexes = indexes[indexes >= 0]
-        if len(indexes) > 0:
-            del self.list[indexes[0]]
+        added = [channel_entry for channel_entry in self.added if channel_entry["id"] != channel_id]
+        if len(added) < len(self.added):
+            self.added = added
+        elif channel_id in self.store and channel_id not in self.removed:
+            self.removed.append(channel_id)
+
+    def apply(self):
+        """Hand the edits to the store, which writes them to disk"""
+        self.store.apply(added=[self._channel(channel_entry) for channel_entry in self.added],
+                         removed=self.removed)
+        self.added = []
+        self.removed = []
+
+    def as_json(self):
+        return ({
+            'added': self.added,
+            'removed': self.removed,
+            'next_id': self.next_id
+        })
 
 
 class ModelEncoder(json.JSONEncoder):
     """Function to write objects to flask session
 
     Inside flask sessions only json objects are allowed. This function enables to
-    decode ChannelList objects as json
+    decode CurrentlyPlaying objects as json
 
     """
     def default(self, obj):
-        if isinstance(obj, ChannelList):
-            return obj.as_json()
         if isinstance(obj, CurrentlyPlaying):
             return obj.as_json()
         # Let the base class default method raise the TypeError
         return json.JSONEncoder.default(self, obj)
 
 
-def channel_list_to_json(json_object):
-    """Create a channel (RemoveChannel) or a list of channels (ChannelList) from a dictionary
-
-    :param json_object: Any kind of json dictionary
-    :return: RemoveChannel or ChannelList object
-    """
-    if 'name' in json_object:
-        return RemoveChannel(json_object['name'], json_object['stream'], json_object['onlineradiobox'],
-                             json_object['id'])
-    else:
-        return ChannelList(list_of_remove_channel=json_object.get('list'), json_file=json_object.get('json_file'))
-
-
 class CurrentlyPlaying(object):
     """Simple representation of a currently playing channel
 
@@ -273,22 +417,155 @@ print("App start at: ")
 print(str(datetime.now().today().isoformat()))
 
 # ----------------------------------------- Location settings -------------------------------------------------
-app_dir = '/home/pi/share/radioflask'
+# RADIOFLASK_DIR moves all files, without it they are on the Pi, or next to this file on simulated hardware
+if hal.is_simulated():
+    app_dir = os.environ.get('RADIOFLASK_DIR', os.path.dirname(os.path.abspath(__file__)))
+else:
+    app_dir = os.environ.get('RADIOFLASK_DIR', '/home/pi/share/radioflask')
 logfile = os.path.join(app_dir, 'static/tests/errorlog.txt')
 lastfm_json = os.path.join(app_dir, 'static/tests/lastfm.json')
 current_json = os.path.join(app_dir, 'static/tests/current.json')
 channel_list_json = os.path.join(app_dir, 'static/tests/channellist.json')
 
 # ----------------------------------------- Radio -------------------------------------------------
+# RADIOFLASK_PLAYER chooses the player backend, see `KyoRadio.start`
+player = os.environ.get('RADIOFLASK_PLAYER', 'omxplayer')
+
+# The channels are read once and shared by the app and the radio
+channel_store = ChannelStore(channel_list_json)
 
 x = KyoRadio()
-x.start(channeldict=channel_list_json, errorlog=logfile, lastfm_json=lastfm_json, current_channel_json=current_json)
+x.start(channels=channel_store, errorlog=logfile, lastfm_json=lastfm_json, current_channel_json=current_json,
+        player=player)
 
 
 # ----------------------------------------- App -------------------------------------------------
+# Most bytes of the error log sent by one response of `/log`
+MAX_LOG_BYTES = 64 * 1024
+# Seconds between two keep-alive comments of `/events`, and the longest wait of a long-poll
+EVENTS_HEARTBEAT = 25
+
+
+@app.route('/log')
+def log_tail():
+    """New lines of the error log
+
+    Query parameters, the page passes what the previous response returned:
+        offset: Byte offset in the log file, without it the last lines are sent
+        file: File id of the log file the offset belongs to, a rotated file is sent from the start
+        seq: Instead of `offset`, return the records kept in memory after this sequence number
+        limit: Most bytes (or records with `seq`) to return, at most MAX_LOG_BYTES
+
+    :return: JSON with `text`, `offset` and `file`, or `records` and `seq`
+    """
+    log = open_log(logfile)
+    limit = min(request.args.get('limit', MAX_LOG_BYTES, type=int), MAX_LOG_BYTES)
+    seq = request.args.get('seq', None, type=int)
+    if seq is not None:
+        records = log.since(seq, limit=limit)
+        return jsonify(records=[dict(record._asdict(), time=record.time.isoformat()) for record in records],
+                       text=''.join(format_record(record) for record in records),
+                       seq=records[-1].seq if records else max(seq, 0))
+    text, offset, file_id = log.tail(request.args.get('offset', None, type=int), limit=max(limit, 1),
+                                     file_id=request.args.get('file', None))
+    return jsonify(text=text, offset=offset, file=file_id)
+
+
+@app.route('/events')
+def events():
+    """Changes of the radio state pushed to the page as server-sent events
+
+    Every event carries the version as its id and a JSON object of the topics that changed
+    (`current`, `channel`, `volume`, `stations`, see `ky40.RadioEvents`). A new client gets
+    all topics first, a reconnecting one only what changed since its `Last-Event-ID`.
+
+    With `?poll=<version>` the request is a long-poll instead: it returns the changes after
+    `version` as JSON as soon as there are any, or after `EVENTS_HEARTBEAT` seconds.
+
+    The request thread sleeps on the condition of `EVENTS` until something changes.
+    """
+    poll = request.args.get('poll', None, type=int)
+    if poll is not None:
+        changes, version = EVENTS.wait(poll, timeout=EVENTS_HEARTBEAT)
+        return jsonify(version=version, changes=changes)
+
+    last_event_id = request.headers.get('Last-Event-ID', '0')
+    version = int(last_event_id) if last_event_id.isdigit() else 0
+
+    def stream(version):
+        yield 'retry: 3000\n\n'
+        while True:
+            changes, new_version = EVENTS.wait(version, timeout=EVENTS_HEARTBEAT)
+            if not changes:
+                # lets the server notice clients that went away
+                yield ': keep-alive\n\n'
+                continue
+            version = new_version
+            yield 'id: {}\nevent: state\ndata: {}\n\n'.format(version, json.dumps(changes))
+
+    return Response(stream(version), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Part of every ETag of the API, versions start over when the app is restarted
+API_GENERATION = format(int(time.time()), 'x')
+
+
+def api_response(version, build):
+    """JSON response with an ETag, `304 Not Modified` if the client has this version already
+
+    :param version: Version of the data, `None` to use a hash of the JSON as ETag
+    :param build: Callable returning the data, not called for a `304` of a known version
+    :return: Response
+    """
+    if version is not None:
+        etag = '{}-{}'.format(API_GENERATION, version)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+    body = json.dumps(build())
+    if version is None:
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # browsers ask again every time, getting a 304 while nothing changed
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/channels')
+def api_channels():
+    """The saved channels of the radio, edits of a browser session not saved yet are not included"""
+    return api_response(channel_store.version, channel_store.to_dicts)
+
+
+@app.route('/api/current')
+def api_current():
+    """The channel and song playing, the dial position and the volume, see `ky40.RadioEvents`"""
+    state, version = EVENTS.get('current', 'channel', 'volume')
+    return api_response(version, lambda: state)
+
+
+@app.route('/api/lastfm')
+def api_lastfm():
+    """Whether last.fm is set up and connected, without the API secret and the password"""
+    def status():
+        lastfm_session = x.lastfm_session
+        doc = lastfm_session.doc if lastfm_session is not None else {}
+        return {
+            'configured': bool(doc),
+            'user': doc.get('user'),
+            'connected': lastfm_session is not None and lastfm_session.network is not None
+        }
+    return api_response(None, status)
+
+
 @app.route('/', methods=['post', 'get'])
 def home():
     save_message = False
+    # the log was kept in the session before, it is fetched from /log now
+    session.pop('error_log_data', None)
 
     # Check if the session needs to be restarted - Every time this app is started fresh
     # or the "clear" or "refresh" button was clicked
@@ -299,8 +576,9 @@ def home():
                     request.form.get('save')
 
     if request.form.get('clear') or not anything_send:
+        # channels added or removed in this session but not saved are dropped
+        session.pop('channel_edits', None)
         try:
-            session.pop('current_channels')
             session.pop('lastfm')
             session.pop('currently_playing')
         except KeyError as e:
@@ -308,22 +586,17 @@ def home():
 
     # -------------- Read in settings from JSON or session -------------------------
     # -------------- Construct filled out forms            -------------------------
-    # Read in the ChannelList object
-    if 'current_channels' not in session:
-        channel_temp = ChannelList(json_file=channel_list_json,
-                                   was_post=request.method == 'POST', list_of_remove_channel=list())
-        channel_temp.from_json()
-        session['current_channels'] = ModelEncoder().encode(channel_temp)
-        print("read channels from Harddrive")
-
     # Read in the last.fm data
     if 'lastfm' not in session:
         # Create form content from json file
-        with open(lastfm_json) as f:
-            form_data = json.load(f)
-            print("read lastfm from Harddrive")
-            lastfm_form = LastFMForm(MultiDict(form_data))
-            session['lastfm'] = form_data
+        try:
+            with open(lastfm_json) as f:
+                form_data = json.load(f)
+                print("read lastfm from Harddrive")
+        except FileNotFoundError:
+            form_data = {}
+        lastfm_form = LastFMForm(MultiDict(form_data))
+        session['lastfm'] = form_data
     else:
         # If User changed the data, add the new from data
         if request.form.get('user'):
@@ -334,7 +607,7 @@ def home():
                     'user': request.form.get('user'),
                     'api': request.form.get('api'),
                     'api_secret': request.form.get('api_secret'),
-                    'password': md5(request.form.get('password'))
+                    'password': pylast.md5(request.form.get('password'))
                 }
                 save_message = True
         # If nothing was done, reload from flask session
@@ -343,12 +616,12 @@ def home():
 
     # Read in Currently Playing from session
     if 'currently_playing' not in session:
-        with open(current_json) as f:
-            currently_playing = json.load(f)
-            currently_playing = CurrentlyPlaying(channel_name=currently_playing['radio'],
-                                                 song=currently_playing['song'],
-                                                 channel_id=currently_playing['id'])
-            session['currently_playing'] = ModelEncoder().encode(currently_playing)
+        # the state the radio holds in memory, current.json may still wait to be written
+        currently_playing = open_state_file(current_json).read()
+        currently_playing = CurrentlyPlaying(channel_name=currently_playing['radio'],
+                                             song=currently_playing['song'],
+                                             channel_id=currently_playing['id'])
+        session['currently_playing'] = ModelEncoder().encode(currently_playing)
     else:
         currently_playing = CurrentlyPlaying(
             channel_name=json.loads(session['currently_playing'])['radio'],
@@ -356,19 +629,8 @@ def home():
             channel_id=json.loads(session['currently_playing'])['id']
         )
 
-    # Read / Write Log Data
-    if 'error_log_data' not in session:
-        with open(logfile) as f:
-            error_log_data = f.read()
-            session['error_log_data'] = error_log_data
-    else:
-        error_log_data = session['error_log_data']
-
-    # Try to read current_channels from session
-    current_channels = json.JSONDecoder(object_hook=channel_list_to_json).decode(session["current_channels"])
-    # If not yet read from disk, read from disk
-    if not current_channels.read_json:
-        current_channels.from_json()
+    # Channels added or removed in this session
+    channel_edits = ChannelEdits(channel_store, session.get('channel_edits'))
 
     # Construct empty Channel Form
     channelform = Channel(request.form)
@@ -379,24 +641,28 @@ def home():
         # new channel was submitted? - Add it if form was filled out correctly
         if request.form.get('channel_name'):
             if channelform.validate_on_submit():
-                current_channels.append(RemoveChannel(
+                channel_edits.append(RemoveChannel(
                     channel_name=request.form.get('channel_name', None),
                     stream_url=request.form.get('stream_url', None),
-                    channel_online_radio_box=request.form.get('online_radio_box')
+                    channel_online_radio_box=request.form.get('online_radio_box'),
+                    source=request.form.get('song_source', 'onlineradiobox')
                 ))
                 save_message = True
 
         # channel should be removed?
         remove_channel_form = request.form.get('removechannel', None)
         if remove_channel_form:
-            current_channels.remove(remove_channel_form)
+            channel_edits.remove(remove_channel_form)
             save_message = True
 
+        session['channel_edits'] = channel_edits.as_json()
+
         # Settings should be stored
         if request.form.get('save', '') == 'save':
 
             # SAVE the settings
-            current_channels.to_json()
+            channel_edits.apply()
+            session.pop('channel_edits', None)
             with open(lastfm_json, 'w') as f:
                 json.dump(session['lastfm'], f)
 
@@ -404,32 +670,29 @@ def home():
             x.stop()
             x.start(errorlog=logfile,
                     lastfm_json=lastfm_json,
-                    channeldict=json.load(open(current_channels.json_file)))
+                    channels=channel_store,
+                    current_channel_json=current_json,
+                    player=player)
 
-        # Refresh button was clicked - Show currently playing and update
-        # errorlog
+        # Refresh button was clicked - Show currently playing, the page fetches the
+        # errorlog from /log
         refresh_info = request.form.get('refresh', None)
         if refresh_info:
-            with open(current_json) as f:
-                currently_playing = json.load(f)
-                currently_playing = CurrentlyPlaying(channel_name=currently_playing['radio'],
-                                                     song=currently_playing['song'],
-                                                     channel_id=currently_playing['id'])
-                session['currently_playing'] = ModelEncoder().encode(currently_playing)
-            with open(logfile) as f:
-                error_log_data = f.read()
-                session['error_log_data'] = error_log_data
+            currently_playing = open_state_file(current_json).read()
+            currently_playing = CurrentlyPlaying(channel_name=currently_playing['radio'],
+                                                 song=currently_playing['song'],
+                                                 channel_id=currently_playing['id'])
+            session['currently_playing'] = ModelEncoder().encode(currently_playing)
 
     """Renders the Universum Internetradio - ."""
-    session["current_channels"] = ModelEncoder().encode(current_channels)
     return render_template(
         'index.html',
         title='Universum Internetradio - ',
         year=datetime.now().year,
         channelform=channelform,
-        remove_channelform=current_channels,
+        remove_channelform=channel_edits,
         lastfm_form=lastfm_form,
         playinfo=currently_playing,
-        save_message=save_message,
-        logdata=error_log_data
+        stations=x.now_playing(),
+        save_message=save_message
     )